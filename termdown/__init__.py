@@ -1,3 +1,7 @@
-from importlib.metadata import version
+def __getattr__(name):
+    # importlib.metadata is slow to import, only load it when needed
+    if name == "VERSION":
+        from importlib.metadata import version
 
-VERSION = version("termdown")
+        return version("termdown")
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
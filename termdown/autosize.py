@@ -0,0 +1,116 @@
+import re
+from datetime import datetime, timezone
+from functools import partial
+from math import ceil
+from string import digits
+
+from art import text2art
+
+from .ttf import ttf_text_size
+from .utils import format_seconds, format_seconds_alt, parse_schedule, parse_timestr
+
+DIGIT_REGEX = re.compile(r"\d")
+# in descending order of size
+FIGLET_FONTS = (
+    "doh",
+    "colossal",
+    "univers",
+    "big",
+    "standard",
+    "small",
+    "mini",
+)
+# long weekday and month names, all digits in use
+LONGEST_DATETIME = datetime(2000, 9, 27, 23, 59, 59)
+# assumed length of a stopwatch run without --quit-after
+STOPWATCH_SECONDS = 86399
+
+
+def _max_seconds(args):
+    if args.schedule:
+        segments = parse_schedule(args.schedule)
+        start = datetime.now(timezone.utc)
+        longest = 0
+        for target, _, _ in segments:
+            longest = max(longest, (target - start).total_seconds())
+            start = target
+        return longest
+    elif args.timespec:
+        target = parse_timestr(args.timespec)
+        return max((target - datetime.now(timezone.utc)).total_seconds(), 0)
+    return float(args.quit_after or STOPWATCH_SECONDS)
+
+
+def longest_text(args):
+    """
+    Returns the longest text the mode given by args will show, so the
+    size fitted to it can be used for the whole run.
+    """
+    if args.time:
+        return LONGEST_DATETIME.strftime(args.time_format)
+    formatter = format_seconds_alt if args.alt_format else format_seconds
+    max_seconds = int(ceil(_max_seconds(args)))
+    # everything within the last hour plus values like 1h 59m 59s
+    candidates = set(range(max(max_seconds - 3600, 0), max_seconds + 1))
+    for period_seconds in (60, 3600, 86400, 31557600):
+        if max_seconds >= period_seconds:
+            candidates.add(max_seconds // period_seconds * period_seconds - 1)
+    return max(
+        (
+            formatter(seconds, hide_seconds=args.no_seconds)
+            for seconds in sorted(candidates, reverse=True)
+        ),
+        key=len,
+    )
+
+
+def figlet_text_size(text, font):
+    lines = text2art(text, font=font).rstrip("\n").split("\n")
+    return max(len(line) for line in lines), len(lines)
+
+
+def widest_text(text, measure):
+    """
+    Replaces all digits in text with the widest digit according to the
+    given measuring function, so the result is at least as wide as any
+    text of the same shape.
+    """
+    widest_digit = max(digits, key=lambda digit: measure(digit)[0])
+    return DIGIT_REGEX.sub(widest_digit, text)
+
+
+def fit_ttf_size(text, font_path, rows, cols):
+    """
+    Returns the largest font size at which any text shaped like the given
+    one fits into rows and cols.
+    """
+
+    def fits(font_size):
+        measure = partial(ttf_text_size, font_path=font_path, font_size=font_size)
+        width, height = measure(widest_text(text, measure))
+        return width <= cols and height <= rows
+
+    # one character per pixel, so the font size can't reasonably exceed
+    # twice the number of rows
+    lower, upper = 1, max(2 * rows, 1)
+    while lower < upper:
+        middle = (lower + upper + 1) // 2
+        if fits(middle):
+            lower = middle
+        else:
+            upper = middle - 1
+    return lower
+
+
+def fit_figlet_font(text, fonts, rows, cols):
+    """
+    Returns the largest of the given fonts in which any text shaped like
+    the given one fits into rows and cols, or None.
+    """
+    best_font, best_area = None, 0
+    for font in fonts:
+        measure = partial(figlet_text_size, font=font)
+        width, height = measure(widest_text(text, measure))
+        if width <= cols and height <= rows and width * height > best_area:
+            best_font, best_area = font, width * height
+    return best_font
@@ -1,14 +1,12 @@
 import os
-from argparse import ArgumentParser, RawTextHelpFormatter
-from curses import wrapper
+from argparse import Action, ArgumentParser, RawTextHelpFormatter
 from functools import wraps
 from os.path import abspath, dirname
 from sys import stderr
 
-from . import VERSION
-from .modes import clock, countdown, stopwatch
-from .ui import Ui
-from .utils import format_seconds, normalize_text
+# Everything involving curses, art, PIL or dateutil is imported in main()
+# so `termdown --status` can skip it.
+from .status import Registration, print_status
 
 DEFAULT_FONT = "univers"
 DEFAULT_TIME_FORMAT = "%H:%M:%S"  # --no-seconds expects this to end with :%S
@@ -20,6 +18,21 @@ def _escape_percent_for_argparse_help(text):
     return text.replace("%", "%%")
 
 
+class VersionAction(Action):
+    """
+    Like argparse's "version" action, but only looks up the version
+    when actually asked for it.
+    """
+
+    def __init__(self, option_strings, dest, **kwargs):
+        super().__init__(option_strings, dest, nargs=0, **kwargs)
+
+    def __call__(self, parser, namespace, values, option_string=None):
+        from . import VERSION
+
+        parser.exit(message="{} {}\n".format(parser.prog, VERSION))
+
+
 def graceful_ctrlc(func):
     """
     Makes the decorated function exit with code 1 on CTRL+C.
@@ -79,6 +92,12 @@ parser.add_argument(
     help="Draw final N seconds in red and announce them individually with --voice "
     "or --exec-cmd (defaults to 3)",
 )
+parser.add_argument(
+    "--color-at",
+    metavar="RULES",
+    help="Change color when the countdown gets down to the given durations, "
+    "e.g. '10m:yellow,1m:red'",
+)
 parser.add_argument(
     "-e",
     "--end",
@@ -105,6 +124,11 @@ parser.add_argument(
     metavar="N",
     help="Set font size when using OTF/TTF",
 )
+parser.add_argument(
+    "--auto-size",
+    action="store_true",
+    help="Pick the largest OTF/TTF font size (or ASCII art font) that fits the terminal",
+)
 parser.add_argument(
     "-p",
     "--voice-prefix",
@@ -152,6 +176,12 @@ parser.add_argument(
     metavar="PATH",
     help="File to write current remaining/elapsed time to",
 )
+parser.add_argument(
+    "--state-feed",
+    metavar="PATH",
+    help="Publish live countdown/stopwatch state to a memory-mapped file at PATH "
+    "(e.g. in /dev/shm), see termdown/feed.py for the layout",
+)
 parser.add_argument(
     "--exec-cmd",
     metavar="CMD",
@@ -160,6 +190,18 @@ parser.add_argument(
     "--voice, respectively. For example, to get a callout at five seconds only, "
     "use: --exec-cmd \"if [ '{0}' == '5' ]; then say -v Alex {1}; fi\"",
 )
+parser.add_argument(
+    "--renderer",
+    choices=("curses", "ansi"),
+    default="curses",
+    help="Draw with curses (default) or with plain ANSI escape sequences, "
+    "which starts faster and writes less over slow connections",
+)
+parser.add_argument(
+    "--trace-file",
+    metavar="PATH",
+    help="Write input and tick latencies to PATH in Chrome trace event format",
+)
 parser.add_argument(
     "--no-art", action="store_true", help="Don't use ASCII art for display"
 )
@@ -174,6 +216,13 @@ parser.add_argument(
     action="store_true",
     help="Show current time instead of countdown/stopwatch",
 )
+parser.add_argument(
+    "--zones",
+    dest="zone_names",
+    metavar="LIST",
+    help="Show current time for a comma-separated list of time zones "
+    "(e.g. 'local,UTC,Asia/Tokyo'), implies --time",
+)
 parser.add_argument(
     "-Z",
     "--time-format",
@@ -193,31 +242,101 @@ parser.add_argument(
     help="TIME to countdown to. Example values: 10, '1h 5m 30s', '12:00', "
     "'2020-01-01', '2020-01-01 14:00 UTC'. If not given, operates in stopwatch mode.",
 )
+parser.add_argument(
+    "--schedule",
+    metavar="FILE",
+    help="Run the countdowns listed in FILE back to back, one "
+    "'TIME [| TITLE [| TEXT]]' per line. Only the last line can have a TEXT, "
+    "--text, --blink and --quit-after apply to its end",
+)
+parser.add_argument(
+    "--register",
+    action="store_true",
+    help="Make this countdown/stopwatch show up in termdown --status",
+)
+parser.add_argument(
+    "--status",
+    action="store_true",
+    help="Show remaining/elapsed time of all instances started with --register and exit",
+)
 parser.add_argument(
     "--version",
-    action="version",
-    version=f"%(prog)s {VERSION}",
+    action=VersionAction,
     help="Show version and exit",
 )
 
 
-@graceful_ctrlc
-def curses_ui(stdscr, mode, args):
-    ui = Ui(stdscr, args)
+def run_ui(renderer, mode, args):
+    from .ui import Ui
+
+    ui = Ui(renderer, args)
+    if args.register:
+        ui.registration = Registration(mode.__name__, args.title)
+    if args.state_feed:
+        from .feed import StateFeed
+
+        ui.state_feed = StateFeed(args.state_feed, mode.__name__)
     ui.start_input_thread()
     try:
         return mode(ui, args)
     finally:
-        with ui.curses_lock:
-            if not args.no_window_title:
-                ui.set_window_title("")
+        if not args.no_window_title:
+            ui.set_window_title("")
+        if ui.tracer is not None:
+            ui.tracer.save()
+        if ui.registration is not None:
+            ui.registration.remove()
+        if ui.state_feed is not None:
+            ui.state_feed.close()
 
 
-def main():
-    args = parser.parse_args()
+@graceful_ctrlc
+def curses_ui(stdscr, mode, args):
+    from .renderers import CursesRenderer
+
+    renderer = CursesRenderer(stdscr)
+    try:
+        return run_ui(renderer, mode, args)
+    finally:
+        renderer.close()
+
+
+@graceful_ctrlc
+def ansi_ui(mode, args):
+    from .renderers import AnsiRenderer
+
+    renderer = AnsiRenderer()
+    try:
+        return run_ui(renderer, mode, args)
+    finally:
+        renderer.close()
+
+
+def start_ui(mode, args):
+    if args.renderer == "ansi":
+        return ansi_ui(mode, args)
+    from curses import wrapper
+
+    return wrapper(curses_ui, mode, args)
+
+
+def prepare_args(args):
+    """
+    Validates parsed arguments and fills in derived values.
+    """
+    from .utils import normalize_text
+
     if args.exec_cmd and args.voice:  # prevent passing both --exec-cmd and --voice
         raise RuntimeError("--exec-cmd and --voice are mutually exclusive")
 
+    if args.renderer == "ansi":
+        import signal
+        from importlib.util import find_spec
+
+        # raw mode and resize handling are POSIX only
+        if find_spec("termios") is None or not hasattr(signal, "SIGWINCH"):
+            raise RuntimeError("--renderer ansi is not available on this platform")
+
     if args.time_format is None:
         args.time_format = (
             DEFAULT_TIME_FORMAT[:-3] if args.no_seconds else DEFAULT_TIME_FORMAT
@@ -225,15 +344,48 @@ def main():
     if args.date_format is None:
         args.date_format = DEFAULT_DATE_FORMAT
 
+    if args.state_feed and not os.access(
+        dirname(abspath(args.state_feed)), os.W_OK
+    ):
+        raise RuntimeError("Unable to write file: {}".format(args.state_feed))
+
     if args.outfile:
         if os.path.exists(args.outfile):
             raise RuntimeError("File already exists: {}".format(args.outfile))
         if not os.access(dirname(abspath(args.outfile)), os.W_OK):
             raise RuntimeError("Unable to write file: {}".format(args.outfile))
 
+    from .colors import ColorTable, parse_color_rules
+
+    args.color_table = ColorTable(
+        args.critical,
+        parse_color_rules(args.color_at) if args.color_at else (),
+        blink=args.blink,
+    )
+
     if args.text and not args.no_text_magic:
         args.text = normalize_text(args.text)
 
+    args.zones = None
+    if args.zone_names:
+        from .zones import parse_zones
+
+        args.zones = parse_zones(args.zone_names)
+        args.time = True
+
+    # there's no timer to register or publish in clock mode
+    if args.register and args.time:
+        raise RuntimeError("--register can't be combined with --time or --zones")
+    if args.state_feed and args.time:
+        raise RuntimeError("--state-feed can't be combined with --time or --zones")
+
+    if args.schedule:
+        from .utils import parse_schedule
+
+        if args.timespec or args.time:
+            raise RuntimeError("--schedule can't be combined with TIME or --time")
+        parse_schedule(args.schedule)  # fail before taking over the terminal
+
     args.voice_cmd = None
     if args.voice:
         for cmd in ("/usr/bin/say", "/usr/bin/espeak", "/usr/bin/espeak-ng"):
@@ -242,13 +394,28 @@ def main():
                 break
     if args.voice or args.exec_cmd:
         args.voice_prefix = args.voice_prefix or ""
+    return args
+
+
+def main():
+    args = parser.parse_args()
+    if args.status:
+        print_status()
+        return
+
+    from .modes import clock, countdown, schedule, stopwatch
+    from .utils import format_seconds
+
+    prepare_args(args)
 
     if args.time:
-        wrapper(curses_ui, clock, args)
+        start_ui(clock, args)
+    elif args.schedule:
+        start_ui(schedule, args)
     elif args.timespec:
-        wrapper(curses_ui, countdown, args)
+        start_ui(countdown, args)
     else:
-        seconds_elapsed, laps = wrapper(curses_ui, stopwatch, args)
+        seconds_elapsed, laps = start_ui(stopwatch, args)
 
         for lap_index, lap_time in enumerate(laps):
             stderr.write(
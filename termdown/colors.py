@@ -0,0 +1,75 @@
+from bisect import bisect_left
+
+from .renderers import DEFAULT_COLOR
+from .utils import TIMESPEC_RELATIVE, timespec_intent
+
+# indexes are curses color numbers
+COLOR_NAMES = ("black", "red", "green", "yellow", "blue", "magenta", "cyan", "white")
+# pairs 1-4 are taken by ui.COLOR_PAIRS, rule colors get RULE_PAIR_BASE + color
+RULE_PAIR_BASE = 8
+BLINK_INTERVAL = 0.5
+
+
+def parse_color_rules(spec):
+    """
+    Turns "10m:yellow,1m:red" into [(600.0, 3), (60.0, 1)].
+    """
+    rules = []
+    for rule in spec.split(","):
+        rule = rule.strip()
+        if not rule:
+            continue
+        timestr, _, color = rule.rpartition(":")
+        try:
+            kind, seconds = timespec_intent(timestr)
+        except ValueError:
+            kind = None
+        if kind != TIMESPEC_RELATIVE:
+            raise RuntimeError("Invalid duration in --color-at: {}".format(rule))
+        if color.lower() not in COLOR_NAMES:
+            raise RuntimeError(
+                "Unknown color in --color-at: {} (choose from {})".format(
+                    color, ", ".join(COLOR_NAMES)
+                )
+            )
+        rules.append((float(seconds), COLOR_NAMES.index(color.lower())))
+    return rules
+
+
+class ColorTable:
+    """
+    Maps the seconds left on a countdown to a color pair. Built once at
+    startup from --critical, --color-at and --blink, so each lookup is
+    just a bisection.
+    """
+
+    def __init__(self, critical, rules=(), blink=False):
+        pairs = {float(critical): 1}
+        for seconds, color in rules:
+            pairs[seconds] = RULE_PAIR_BASE + color
+        self._thresholds = sorted(pairs)
+        self._pairs = [pairs[threshold] for threshold in self._thresholds]
+        self._blink = blink
+        self.color_pairs = {
+            RULE_PAIR_BASE + color: (color, DEFAULT_COLOR) for _, color in rules
+        }
+
+    def state(self, seconds_left):
+        """
+        Returns the color pair for the given number of seconds left and
+        the number of seconds left at which it will change next, or None
+        if it won't. Zero and below is the "time is up" state, which
+        blinks between pairs 1 and 4 with --blink.
+        """
+        if seconds_left <= 0:
+            if not self._blink:
+                return 0, None
+            seconds_over = -seconds_left
+            phase = int(seconds_over / BLINK_INTERVAL)
+            return (
+                1 if phase % 2 == 0 else 4,
+                -(phase + 1) * BLINK_INTERVAL,
+            )
+        index = bisect_left(self._thresholds, seconds_left)
+        color = self._pairs[index] if index < len(self._pairs) else 0
+        return color, self._thresholds[index - 1] if index else 0
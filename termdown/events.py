@@ -1,3 +1,5 @@
+from time import perf_counter
+
 INPUT_PAUSE = 1
 INPUT_RESET = 2
 INPUT_EXIT = 3
@@ -6,3 +8,34 @@ INPUT_PLUS = 5
 INPUT_MINUS = 6
 INPUT_END = 7
 TIME_TICK = 8
+WINDOW_RESIZE = 9
+
+EVENT_NAMES = {
+    INPUT_PAUSE: "pause",
+    INPUT_RESET: "reset",
+    INPUT_EXIT: "exit",
+    INPUT_LAP: "lap",
+    INPUT_PLUS: "plus",
+    INPUT_MINUS: "minus",
+    INPUT_END: "end",
+    TIME_TICK: "tick",
+    WINDOW_RESIZE: "resize",
+}
+
+
+class EventRecord:
+    """
+    An event as it travels through Ui.input_queue, along with where it
+    came from and when it was created and eventually painted.
+    """
+
+    __slots__ = ("kind", "source", "created", "painted")
+
+    def __init__(self, kind, source):
+        self.kind = kind
+        self.source = source
+        self.created = perf_counter()
+        self.painted = None
+
+    def __repr__(self):
+        return "<EventRecord {} from {}>".format(EVENT_NAMES[self.kind], self.source)
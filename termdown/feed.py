@@ -0,0 +1,116 @@
+import mmap
+import os
+import struct
+from time import sleep
+
+from .status import MODES
+
+# Fixed layout, little-endian, 48 bytes:
+#
+#   0  magic "TDFD"
+#   4  version (uint8), 3 bytes padding
+#   8  sequence (uint64), odd while an update is being written
+#  16  mode (uint8, index into status.MODES)
+#  17  paused (uint8)
+#  18  running (uint8), 0 once termdown has exited
+#  19  padding
+#  20  lap count (uint32)
+#  24  reference timestamp (double): the target of a countdown or the
+#      time a stopwatch was started at, in seconds since the epoch
+#  32  frozen seconds (double): remaining/elapsed seconds as of the last
+#      update, which is what to show while paused
+#  40  timestamp of the last update (double)
+#
+# While running, readers compute remaining/elapsed time from the
+# reference and their own clock, termdown only writes when it wakes up
+# anyway (e.g. on pause, lap or when the display changes).
+HEADER = struct.Struct("<4sBxxxQ")
+SEQUENCE = struct.Struct("<Q")
+SEQUENCE_OFFSET = 8
+PAYLOAD = struct.Struct("<BBBxIddd")
+PAYLOAD_OFFSET = HEADER.size
+FEED_MAGIC = b"TDFD"
+FEED_VERSION = 1
+FEED_SIZE = HEADER.size + PAYLOAD.size
+# an update takes microseconds, readers retry for about 0.1s at most
+READ_SPINS = 100
+READ_ATTEMPTS = 1000
+READ_BACKOFF = 0.0001
+
+
+class StateFeed:
+    """
+    Publishes the timer state into a memory-mapped file for readers
+    polling at high frequency (overlays, LED matrices, ...). Updates are
+    guarded by a seqlock: the sequence number is odd while an update is
+    being written, so readers retry until they get the same even number
+    before and after reading the payload.
+    """
+
+    def __init__(self, path, mode):
+        self._path = path
+        self._mode = MODES.index(mode)
+        self._sequence = 0
+        fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            os.ftruncate(fd, FEED_SIZE)
+            self._map = mmap.mmap(fd, FEED_SIZE)
+        finally:
+            os.close(fd)  # the mapping stays valid
+        HEADER.pack_into(self._map, 0, FEED_MAGIC, FEED_VERSION, self._sequence)
+
+    def _write(self, *payload):
+        self._sequence += 1
+        SEQUENCE.pack_into(self._map, SEQUENCE_OFFSET, self._sequence)
+        PAYLOAD.pack_into(self._map, PAYLOAD_OFFSET, *payload)
+        self._sequence += 1
+        SEQUENCE.pack_into(self._map, SEQUENCE_OFFSET, self._sequence)
+
+    def update(self, reference, paused, frozen_seconds, updated, laps=0):
+        self._write(self._mode, paused, True, laps, reference, frozen_seconds, updated)
+
+    def close(self):
+        """
+        Tells readers that still have the file mapped that we're gone
+        and removes it.
+        """
+        payload = list(PAYLOAD.unpack_from(self._map, PAYLOAD_OFFSET))
+        payload[2] = False  # running
+        self._write(*payload)
+        self._map.close()
+        try:
+            os.unlink(self._path)
+        except FileNotFoundError:
+            pass
+
+
+def read_feed(buffer):
+    """
+    Returns (sequence, mode, paused, running, laps, reference,
+    frozen_seconds, updated) from a buffer holding a mapped feed, or
+    None if it isn't one or no consistent state could be read (e.g.
+    because termdown died in the middle of an update).
+    """
+    magic, version, _ = HEADER.unpack_from(buffer, 0)
+    if magic != FEED_MAGIC or version != FEED_VERSION:
+        return None
+    for attempt in range(READ_ATTEMPTS):
+        if attempt >= READ_SPINS:
+            sleep(READ_BACKOFF)
+        sequence = SEQUENCE.unpack_from(buffer, SEQUENCE_OFFSET)[0]
+        if sequence % 2:  # update in progress
+            continue
+        payload = PAYLOAD.unpack_from(buffer, PAYLOAD_OFFSET)
+        if SEQUENCE.unpack_from(buffer, SEQUENCE_OFFSET)[0] == sequence:
+            mode, paused, running, laps, reference, frozen_seconds, updated = payload
+            return (
+                sequence,
+                MODES[mode],
+                bool(paused),
+                bool(running),
+                laps,
+                reference,
+                frozen_seconds,
+                updated,
+            )
+    return None
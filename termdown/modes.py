@@ -1,11 +1,9 @@
-import os
-from curses import beep
-from datetime import datetime, timedelta, timezone
+from array import array
+from datetime import timedelta, timezone
 from math import ceil
 from queue import Empty
 from subprocess import DEVNULL, STDOUT, Popen
-from sys import exit, stdout
-from time import monotonic, time
+from sys import exit
 
 from .events import (
     INPUT_END,
@@ -17,29 +15,147 @@ from .events import (
     INPUT_RESET,
 )
 from .ticker import Metronome
+from .timesource import SYSTEM_TIME
 from .utils import (
     format_seconds,
     format_seconds_alt,
     format_target,
+    normalize_text,
+    parse_schedule,
     parse_timestr,
+    strftime_resolution,
 )
+from .zones import world_clock
 
 
-def countdown(ui, args):
-    target_time = parse_timestr(args.timespec)
+def _run_in_background(children, cmd, **kwargs):
+    """
+    Starts cmd without waiting for it, reaping earlier ones that have
+    finished in the meantime so they don't pile up as zombies.
+    """
+    children[:] = [child for child in children if child.poll() is None]
+    children.append(Popen(cmd, stdout=DEVNULL, stderr=STDOUT, **kwargs))
+
+
+def _needs_every_tick(args):
+    """
+    Returns True if something other than the display has to happen once
+    per second, no matter whether the display changes or not.
+    """
+    return bool(args.exec_cmd or args.outfile)
+
+
+def _countdown_next_change(seconds_left, args):
+    """
+    Returns the number of remaining seconds at which the countdown
+    needs to wake up next to change the display or announce something.
+    """
+    current = int(ceil(seconds_left))
+    if (
+        _needs_every_tick(args) or
+        not args.no_seconds or
+        current <= 61 or
+        current - 1 <= args.critical
+    ):
+        return current - 1
+    # with --no-seconds, the text only changes with the minute
+    candidates = [max(60 * int(current / 60) - 1, 60)]
+    color_change = args.color_table.state(seconds_left)[1]
+    if color_change:
+        candidates.append(color_change)
+    if args.voice_cmd:
+        candidates.extend(
+            point
+            for point in (5, 10, 20, 30, 60, 300, 600, 1800, 3600)
+            if point < current
+        )
+    return max(candidates)
+
+
+def _stopwatch_next_change(seconds_elapsed, args):
+    """
+    Returns the number of elapsed seconds at which the stopwatch
+    needs to wake up next to change the display or announce something.
+    """
+    current = round(seconds_elapsed)
+    if (
+        _needs_every_tick(args) or
+        not args.no_seconds or
+        current <= 60 or
+        current < args.critical
+    ):
+        return current + 1
+    # with --no-seconds, the text only changes with the minute
+    candidates = [60 * (int(current / 60) + 1)]
+    if args.voice_cmd:
+        candidates.append(3600 * (int(current / 3600) + 1))
+        candidates.extend(
+            point
+            for point in (5, 10, 20, 30, 40, 50, 60, 120, 180, 300, 600, 1800)
+            if point > current
+        )
+    if args.quit_after and args.quit_after > current:
+        candidates.append(args.quit_after)
+    return min(candidates)
+
+
+def _clock_next_change(now, args):
+    """
+    Returns the number of seconds until the clock display changes.
+    """
+    resolution = strftime_resolution(args.time_format)
+    if _needs_every_tick(args) or resolution == 1:
+        return 1
+    elif resolution == 60:
+        boundary = now.replace(second=0, microsecond=0) + timedelta(minutes=1)
+    else:
+        boundary = now.replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
+    return (boundary - now).total_seconds()
+
+
+def countdown(ui, args, time_source=SYSTEM_TIME, target_time=None):
+    """
+    Counts down to args.timespec or, if given, target_time. Returns True
+    if the user quit after the countdown had finished.
+    """
+    initial_target = target_time
+    if initial_target is None:
+        target_time = parse_timestr(args.timespec, time_source=time_source)
     offset = (target_time.microsecond / 1_000_000)
-    ticker = Metronome(ui.input_queue, offset=offset)
+    ticker = Metronome(ui.input_queue, offset=offset, time_source=time_source)
     ticker.start()
+    try:
+        return _countdown(ui, args, time_source, ticker, target_time, initial_target)
+    finally:
+        ticker.stop()
+
+
+def _countdown(ui, args, time_source, ticker, target_time, initial_target):
+    children = []
 
     while True:  # Outer loop to allow restarting countdown from scratch
         while True:  # Active countdown loop
-            seconds_left = (target_time - datetime.now(timezone.utc)).total_seconds()
+            seconds_left = (
+                target_time - time_source.now(timezone.utc)
+            ).total_seconds()
             if seconds_left <= 0:
                 # If seconds_left is zero or negative, immediately break to handle the
                 # "finished" state. This prevents displaying "0" for an entire second
                 # while waiting for the next tick.
                 break
 
+            if ui.registration is not None:
+                ui.registration.update(
+                    target_time.timestamp(), ticker.is_paused, seconds_left
+                )
+            if ui.state_feed is not None:
+                ui.state_feed.update(
+                    target_time.timestamp(),
+                    ticker.is_paused,
+                    seconds_left,
+                    time_source.time(),
+                )
+
             if args.alt_format:
                 countdown_text = format_seconds_alt(
                     seconds_left, hide_seconds=args.no_seconds
@@ -49,26 +165,25 @@ def countdown(ui, args):
                     seconds_left, hide_seconds=args.no_seconds
                 )
 
-            with ui.curses_lock:
-                ui.set_window_title(countdown_text)
-                if args.outfile:
-                    with open(args.outfile, "w") as f:
-                        f.write("{}\n{}\n".format(countdown_text, seconds_left))
-                end_text = (
-                    format_target(
-                        target_time,
-                        time_format=args.time_format,
-                        date_format=args.date_format,
-                    )
-                    if args.end
-                    else None
+            ui.set_window_title(countdown_text)
+            if args.outfile:
+                with open(args.outfile, "w") as f:
+                    f.write("{}\n{}\n".format(countdown_text, seconds_left))
+            end_text = (
+                format_target(
+                    target_time,
+                    time_format=args.time_format,
+                    date_format=args.date_format,
+                    time_source=time_source,
                 )
-                color = 0
-                if ticker.is_paused:
-                    color = 3
-                elif seconds_left <= args.critical:
-                    color = 1
-                ui.draw_text(countdown_text, color=color, end=end_text)
+                if args.end
+                else None
+            )
+            if ticker.is_paused:
+                color = 3
+            else:
+                color = args.color_table.state(seconds_left)[0]
+            ui.draw_text(countdown_text, color=color, end=end_text)
 
             annunciation = None
             if seconds_left <= args.critical:
@@ -87,21 +202,24 @@ def countdown(ui, args):
                 if (
                     annunciation and args.voice_cmd
                 ):  # Only announce if there is something to say
-                    Popen(
+                    _run_in_background(
+                        children,
                         [args.voice_cmd, "-v", args.voice, annunciation.strip()],
-                        stdout=DEVNULL,
-                        stderr=STDOUT,
                     )
                 if args.exec_cmd:
                     # Pass annunciation even if it's empty, format() handles it.
-                    Popen(
+                    _run_in_background(
+                        children,
                         args.exec_cmd.format(seconds_left, annunciation or ""),
-                        stdout=DEVNULL,
-                        stderr=STDOUT,
                         shell=True,
                     )
 
-            input_action = ui.input_queue.get()
+            ticker.sleep_until(
+                time_source.time() +
+                seconds_left -
+                _countdown_next_change(seconds_left, args)
+            )
+            input_action = ui.get_input()
             if input_action == INPUT_PAUSE:
                 duration = ticker.pause()
                 if duration:
@@ -109,7 +227,9 @@ def countdown(ui, args):
             elif input_action == INPUT_EXIT:
                 exit(1)
             elif input_action == INPUT_RESET:
-                target_time = parse_timestr(args.timespec)
+                target_time = initial_target or parse_timestr(
+                    args.timespec, time_source=time_source
+                )
                 # Continue the inner loop, seconds_left will be re-evaluated
                 continue
             elif input_action == INPUT_PLUS:
@@ -123,65 +243,117 @@ def countdown(ui, args):
         # After the active countdown loop, handle the "time is up" state.
 
         if not args.no_bell:
-            with ui.curses_lock:
-                beep()
+            ui.beep()
 
         if args.outfile:
             with open(args.outfile, "w") as f:
                 f.write("{}\n{}\n".format(args.text if args.text else "DONE", 0))
 
         if args.blink or args.text:
-            base_color = 1 if args.blink else 0
-            flip = True
-            ticker.pause()  # Pause ticker during blinking phase
+            ticker.pause()  # the end state schedules its own wakeups
             while True:
-                if args.quit_after and (
-                    datetime.now(timezone.utc) - target_time
-                ).total_seconds() > float(args.quit_after):
+                seconds_left = (
+                    target_time - time_source.now(timezone.utc)
+                ).total_seconds()
+                if args.quit_after and -seconds_left >= float(args.quit_after):
                     return
-                with ui.curses_lock:
-                    ui.set_window_title("/" if flip else "\\")
-                    if args.text:
-                        ui.draw_text(args.text, color=base_color if flip else 4)
-                    else:
-                        ui.draw_text("", color=base_color if flip else 4)
-                if args.blink:
-                    flip = not flip
+                color, next_change = args.color_table.state(seconds_left)
+                ui.set_window_title("\\" if color == 4 else "/")
+                ui.draw_text(args.text or "", color=color)
+                # sleep until the blink phase flips or it's time to quit
+                timeouts = []
+                if next_change is not None:
+                    timeouts.append(seconds_left - next_change)
+                if args.quit_after:
+                    timeouts.append(float(args.quit_after) + seconds_left)
                 try:
-                    input_action = ui.input_queue.get(True, 0.5)
+                    input_action = ui.get_input(
+                        timeout=max(min(timeouts), 0) if timeouts else None
+                    )
                 except Empty:
                     input_action = None
                 if input_action == INPUT_EXIT:
-                    return
+                    return True
                 elif input_action == INPUT_RESET:
-                    target_time = parse_timestr(args.timespec)
+                    target_time = initial_target or parse_timestr(
+                        args.timespec, time_source=time_source
+                    )
                     ticker.pause()  # resume
                     break  # Break out of the blinking loop to restart the main countdown
         else:
             break
 
 
-def clock(ui, args):
-    time_started = monotonic()
+def schedule(ui, args, time_source=SYSTEM_TIME):
+    """
+    Runs the countdowns from the agenda in args.schedule back to back.
+    Segments whose end has already passed are skipped. Each segment
+    starts right when the previous one ends, so --text, --blink and
+    --quit-after only apply to the end of the last one.
+    """
+    segments = parse_schedule(args.schedule, time_source=time_source)
+    title, text, blink, quit_after = args.title, args.text, args.blink, args.quit_after
+    for index, (target_time, segment_title, segment_text) in enumerate(segments):
+        if target_time <= time_source.now(timezone.utc):
+            continue
+        # the Ui reads the title from args, so segments take turns owning it
+        args.title = segment_title or title
+        if index + 1 < len(segments):
+            args.text, args.blink, args.quit_after = None, False, None
+        else:
+            args.text = segment_text or text
+            args.blink, args.quit_after = blink, quit_after
+            if args.text and not args.no_text_magic:
+                args.text = normalize_text(args.text)
+        if countdown(ui, args, time_source=time_source, target_time=target_time):
+            return
+
+
+def clock(ui, args, time_source=SYSTEM_TIME):
+    time_started = time_source.monotonic()
     seconds_elapsed = 0
     offset = timedelta(0)
-    ticker = Metronome(ui.input_queue)
+    ticker = Metronome(ui.input_queue, time_source=time_source)
     ticker.start()
     while True:
-        seconds_elapsed = monotonic() - time_started
+        seconds_elapsed = time_source.monotonic() - time_started
         if args.quit_after and seconds_elapsed >= float(args.quit_after):
             return
-        clock_text = (datetime.now() + offset).strftime(args.time_format)
-        with ui.curses_lock:
-            ui.set_window_title(clock_text)
+        if args.zones:
+            clock_now = time_source.now(timezone.utc) + offset
+            blocks = world_clock(args.zones, clock_now, args.time_format)
+            cells = tuple((", ".join(labels), text) for labels, text, local in blocks)
+            clock_text = " | ".join("{} {}".format(*cell) for cell in cells)
+        else:
+            clock_now = time_source.now() + offset
+            clock_text = clock_now.strftime(args.time_format)
+        ui.set_window_title(clock_text)
 
-            if args.outfile:
-                with open(args.outfile, "w") as f:
-                    f.write("{}\n{}\n".format(clock_text, seconds_elapsed))
+        if args.outfile:
+            with open(args.outfile, "w") as f:
+                f.write("{}\n{}\n".format(clock_text, seconds_elapsed))
 
+        if args.zones:
+            ui.draw_grid(cells, color=3 if ticker.is_paused else 0)
+        else:
             ui.draw_text(clock_text, color=3 if ticker.is_paused else 0)
 
-        input_action = ui.input_queue.get()
+        if args.zones:
+            # each zone may change at a different time (think UTC+05:30 and
+            # hourly formats), or at its next DST transition
+            sleep_time = min(
+                [_clock_next_change(local, args) for labels, text, local in blocks] +
+                [
+                    (zone.valid_until - clock_now).total_seconds()
+                    for zone in args.zones
+                ]
+            )
+        else:
+            sleep_time = _clock_next_change(clock_now, args)
+        if args.quit_after:
+            sleep_time = min(sleep_time, float(args.quit_after) - seconds_elapsed)
+        ticker.sleep_until(time_source.time() + sleep_time)
+        input_action = ui.get_input()
         if input_action == INPUT_EXIT:
             break
         if input_action == INPUT_PLUS:
@@ -194,22 +366,40 @@ def clock(ui, args):
             offset = timedelta(0)
 
 
-def stopwatch(ui, args):
-    time_started = monotonic()
-    ticker = Metronome(ui.input_queue, offset=time() % 1.0)
+def stopwatch(ui, args, time_source=SYSTEM_TIME):
+    time_started = time_source.monotonic()
+    ticker = Metronome(
+        ui.input_queue, offset=time_source.time() % 1.0, time_source=time_source
+    )
     ticker.start()
     time_paused = None
     seconds_elapsed = 0
-    laps = []
+    children = []
+    laps = array("d")
     while True:
         if not time_paused:
-            seconds_elapsed = monotonic() - time_started
+            seconds_elapsed = time_source.monotonic() - time_started
         else:
             seconds_elapsed = time_paused - time_started
 
         if args.quit_after and seconds_elapsed >= float(args.quit_after):
             return seconds_elapsed, laps
 
+        if ui.registration is not None:
+            ui.registration.update(
+                time_source.time() - seconds_elapsed,
+                bool(time_paused),
+                seconds_elapsed,
+            )
+        if ui.state_feed is not None:
+            ui.state_feed.update(
+                time_source.time() - seconds_elapsed,
+                bool(time_paused),
+                seconds_elapsed,
+                time_source.time(),
+                laps=len(laps),
+            )
+
         if args.alt_format:
             stopwatch_text = format_seconds_alt(
                 round(seconds_elapsed), hide_seconds=args.no_seconds
@@ -218,17 +408,12 @@ def stopwatch(ui, args):
             stopwatch_text = format_seconds(
                 round(seconds_elapsed), hide_seconds=args.no_seconds
             )
-        with ui.curses_lock:
-            if not args.no_window_title:
-                os.write(
-                    stdout.fileno(),
-                    "\033]2;{0}\007".format(stopwatch_text).encode(),
-                )
-            if args.outfile:
-                with open(args.outfile, "w") as f:
-                    f.write("{}\n{}\n".format(stopwatch_text, seconds_elapsed))
+        ui.set_window_title(stopwatch_text)
+        if args.outfile:
+            with open(args.outfile, "w") as f:
+                f.write("{}\n{}\n".format(stopwatch_text, seconds_elapsed))
 
-            ui.draw_text(stopwatch_text, color=3 if ticker.is_paused else 0)
+        ui.draw_text(stopwatch_text, color=3 if ticker.is_paused else 0)
 
         annunciation = None
         if int(seconds_elapsed) <= args.critical and seconds_elapsed >= 1:
@@ -249,20 +434,23 @@ def stopwatch(ui, args):
             )
 
         if annunciation and args.voice_cmd:
-            Popen(
+            _run_in_background(
+                children,
                 [args.voice_cmd, "-v", args.voice, annunciation.strip()],
-                stdout=DEVNULL,
-                stderr=STDOUT,
             )
         if args.exec_cmd:
-            Popen(
+            _run_in_background(
+                children,
                 args.exec_cmd.format(seconds_elapsed, annunciation or ""),
-                stdout=DEVNULL,
-                stderr=STDOUT,
                 shell=True,
             )
 
-        input_action = ui.input_queue.get()
+        ticker.sleep_until(
+            time_source.time() +
+            _stopwatch_next_change(seconds_elapsed, args) -
+            seconds_elapsed
+        )
+        input_action = ui.get_input()
         if input_action == INPUT_PLUS:
             time_started -= 10
         elif input_action == INPUT_MINUS:
@@ -273,15 +461,15 @@ def stopwatch(ui, args):
                 time_started += duration
                 time_paused = None
             else:
-                time_paused = monotonic()
+                time_paused = time_source.monotonic()
         elif input_action == INPUT_EXIT:
             break
         elif input_action == INPUT_RESET:
-            laps = []
-            time_started = monotonic()
+            laps = array("d")
+            time_started = time_source.monotonic()
         elif input_action == INPUT_LAP:
-            lap_time = monotonic()
+            lap_time = time_source.monotonic()
             laps.append(lap_time - time_started)
             time_started = lap_time
 
-    return (monotonic() - time_started, laps)
+    return (time_source.monotonic() - time_started, laps)
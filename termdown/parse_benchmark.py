@@ -0,0 +1,115 @@
+import sys
+from argparse import ArgumentParser
+from datetime import date
+from time import perf_counter
+from timeit import Timer
+
+from .utils import _parse_timespec, _parse_timespec_fast, _parse_timespec_slow
+
+CORPUS = (
+    "10",
+    "90",
+    "5m",
+    "1h 5m 30s",
+    "1d 2h",
+    "1.5h",
+    "90.5s",
+    "12:00",
+    "9:05:30",
+    "23:59 UTC",
+    "2030-01-01",
+    "2030-01-01 14:00",
+    "2030-01-01T14:00:00+02:00",
+    "2030-01-01 14:00 UTC",
+    "2pm",
+    "Jan 5 2030",
+    "friday 14:00",
+)
+
+parser = ArgumentParser(
+    prog="python -m termdown.parse_benchmark",
+    description="""
+    Times parsing of TIME values: the dateutil-based parser termdown used
+    to rely on, the fast path that now runs before it and the cached
+    result that resets and schedules get.""",
+)
+parser.add_argument(
+    "--repeat",
+    type=int,
+    default=2000,
+    metavar="N",
+    help="Parse every value N times (defaults to 2000)",
+)
+parser.add_argument(
+    "--corpus",
+    metavar="FILE",
+    help="Read values from FILE, one per line, instead of the built-in corpus",
+)
+
+
+def time_per_call(func, repeat):
+    """
+    Returns the best time per call of func in microseconds, or None if
+    it raises ValueError.
+    """
+    try:
+        func()
+    except ValueError:
+        return None
+    return min(Timer(func).repeat(repeat=5, number=repeat)) / repeat * 1_000_000
+
+
+def format_microseconds(value):
+    return "-" if value is None else "{:.1f}".format(value)
+
+
+def main():
+    args = parser.parse_args()
+    if args.corpus:
+        with open(args.corpus) as f:
+            corpus = [line.strip() for line in f if line.strip()]
+    else:
+        corpus = CORPUS
+    today = date.today()
+
+    started = perf_counter()
+    import dateutil.parser  # noqa: F401
+    import dateutil.tz  # noqa: F401
+
+    print(
+        "importing dateutil: {:.1f} ms\n".format((perf_counter() - started) * 1000)
+    )
+
+    print("TIME\tpath\tdateutil µs\tuncached µs\tcached µs")
+    totals = [0.0, 0.0, 0.0]
+    for timestr in corpus:
+        baseline = time_per_call(
+            lambda: _parse_timespec_slow(timestr, today), args.repeat
+        )
+
+        def uncached():
+            _parse_timespec.cache_clear()
+            return _parse_timespec(timestr, today)
+
+        timings = (
+            baseline,
+            time_per_call(uncached, args.repeat),
+            time_per_call(lambda: _parse_timespec(timestr, today), args.repeat),
+        )
+        for i, timing in enumerate(timings):
+            totals[i] += timing or 0
+        print(
+            "{}\t{}\t{}".format(
+                timestr,
+                "fast" if _parse_timespec_fast(timestr) else "dateutil",
+                "\t".join(format_microseconds(timing) for timing in timings),
+            )
+        )
+    print("total\t\t{}".format("\t".join(format_microseconds(t) for t in totals)))
+    if totals[1] > totals[0]:
+        print("\nThe fast path is slower than dateutil on this corpus", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
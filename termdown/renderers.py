@@ -0,0 +1,223 @@
+import curses
+import os
+import signal
+from select import select
+from sys import stdin, stdout
+
+# same numbering as curses.COLOR_*, -1 is the terminal's default
+DEFAULT_COLOR = -1
+
+
+class KeyReader:
+    """
+    Reads keys straight from the terminal rather than through curses, so
+    the input thread never touches anything the renderer uses. Blocks
+    until there's a key or the terminal was resized, which the SIGWINCH
+    handler reports through a wakeup pipe. Must be created from the main
+    thread.
+    """
+
+    def __init__(self, fd_in):
+        self._fd_in = fd_in
+        self._pending_keys = ""
+        self._wakeup_read, self._wakeup_write = os.pipe()
+        os.set_blocking(self._wakeup_write, False)
+        # the C-level handler writes the signal number to the pipe right
+        # away, no matter what the main thread is busy with
+        self._saved_wakeup_fd = signal.set_wakeup_fd(self._wakeup_write)
+        self._saved_sigwinch = signal.signal(signal.SIGWINCH, self._on_sigwinch)
+
+    def _on_sigwinch(self, signum, frame):
+        # the wakeup pipe does the actual work
+        pass
+
+    def read_key(self):
+        """
+        Returns the next key in the same format as curses' getkey(),
+        "KEY_RESIZE" after a resize.
+        """
+        while not self._pending_keys:
+            watched = [self._wakeup_read]
+            if self._fd_in is not None:
+                watched.append(self._fd_in)
+            readable = select(watched, [], [])[0]
+            if self._wakeup_read in readable:
+                if signal.SIGWINCH in os.read(self._wakeup_read, 64):
+                    return "KEY_RESIZE"
+            if self._fd_in in readable:
+                data = os.read(self._fd_in, 32)
+                if not data:  # stdin was closed, only wait for resizes
+                    self._fd_in = None
+                elif not data.startswith(b"\033"):
+                    # escape sequences are for arrow keys etc., we don't
+                    # use any of them
+                    self._pending_keys = data.decode(errors="replace")
+        key, self._pending_keys = self._pending_keys[0], self._pending_keys[1:]
+        return key
+
+    def close(self):
+        signal.set_wakeup_fd(self._saved_wakeup_fd)
+        signal.signal(
+            signal.SIGWINCH,
+            signal.SIG_DFL if self._saved_sigwinch is None else self._saved_sigwinch,
+        )
+
+
+class CursesRenderer:
+    """
+    Draws frames using curses. Needs to be set up with curses.wrapper().
+    """
+
+    def __init__(self, stdscr):
+        self.stdscr = stdscr
+        try:
+            curses.curs_set(False)
+        except curses.error:
+            # fails on some terminals
+            pass
+        if hasattr(signal, "SIGWINCH"):
+            # input is read by KeyReader, don't let curses look at it at all
+            curses.typeahead(-1)
+            self._keys = KeyReader(stdin.fileno())
+        else:
+            # e.g. Windows: no SIGWINCH and no select() on stdin, so keys
+            # are polled through curses, which has to share the terminal
+            # with rendering
+            self._keys = None
+            stdscr.timeout(0)  # Set timeout for getch/getkey to 0 (non-blocking)
+            stdscr.nodelay(True)  # Set nodelay mode (also non-blocking)
+        self.blocking_input = self._keys is not None
+
+    def init_colors(self, color_pairs):
+        curses.use_default_colors()
+        for pair, (foreground, background) in color_pairs.items():
+            curses.init_pair(pair, foreground, background)
+
+    def size(self):
+        return self.stdscr.getmaxyx()
+
+    def draw(self, lines, color):
+        self.stdscr.erase()
+        for i, line in enumerate(lines):
+            self.stdscr.insstr(i, 0, line, curses.color_pair(color))
+
+    def flush(self):
+        self.stdscr.refresh()
+
+    def resize(self):
+        if self._keys is None:
+            # curses already noticed when it returned KEY_RESIZE
+            return
+        columns, lines = os.get_terminal_size(stdout.fileno())
+        curses.resizeterm(lines, columns)
+
+    def force_redraw(self):
+        self.stdscr.clearok(True)
+
+    def set_title(self, text):
+        os.write(stdout.fileno(), "\033]2;{0}\007".format(text).encode())
+
+    def beep(self):
+        curses.beep()
+
+    def read_key(self):
+        """
+        Returns the next key in the same format as curses' getkey(). Only
+        blocks if blocking_input is True, otherwise returns None if no key
+        was pressed.
+        """
+        if self._keys is not None:
+            return self._keys.read_key()
+        try:
+            return self.stdscr.getkey()
+        except curses.error:
+            return None
+
+    def close(self):
+        if self._keys is not None:
+            self._keys.close()
+
+
+class AnsiRenderer:
+    """
+    Draws frames by writing ANSI escape sequences straight to the terminal,
+    without loading terminfo. Each frame, including any window title
+    update, goes out in a single write.
+    """
+
+    def __init__(self):
+        import termios
+        import tty
+
+        self._termios = termios
+        self._fd_in = stdin.fileno()
+        self._fd_out = stdout.fileno()
+        self._buffer = bytearray()
+        self._color_codes = {0: b"\033[0m"}
+        self._pending_title = None
+
+        self._saved_mode = termios.tcgetattr(self._fd_in)
+        tty.setcbreak(self._fd_in)
+        self._keys = KeyReader(self._fd_in)
+        self.blocking_input = True
+        # alternate screen, hide cursor
+        os.write(self._fd_out, b"\033[?1049h\033[?25l")
+
+    def init_colors(self, color_pairs):
+        for pair, (foreground, background) in color_pairs.items():
+            self._color_codes[pair] = "\033[0;{};{}m".format(
+                39 if foreground == DEFAULT_COLOR else 30 + foreground,
+                49 if background == DEFAULT_COLOR else 40 + background,
+            ).encode()
+
+    def size(self):
+        columns, lines = os.get_terminal_size(self._fd_out)
+        return lines, columns
+
+    def draw(self, lines, color):
+        buffer = self._buffer
+        buffer.clear()
+        if self._pending_title is not None:
+            buffer += "\033]2;{0}\007".format(self._pending_title).encode()
+            self._pending_title = None
+        buffer += self._color_codes[color]
+        for i, line in enumerate(lines):
+            buffer += "\033[{};1H".format(i + 1).encode()
+            buffer += line.encode()
+        buffer += b"\033[0m"
+
+    def flush(self):
+        if self._pending_title is not None:
+            self._buffer += "\033]2;{0}\007".format(self._pending_title).encode()
+            self._pending_title = None
+        written = 0
+        with memoryview(self._buffer) as view:
+            while written < len(view):
+                written += os.write(self._fd_out, view[written:])
+        self._buffer.clear()
+
+    def resize(self):
+        # size() always asks the terminal
+        pass
+
+    def force_redraw(self):
+        # every frame covers the whole screen anyway
+        pass
+
+    def set_title(self, text):
+        # sent along with the next frame
+        self._pending_title = text
+
+    def beep(self):
+        self._buffer += b"\007"
+        self.flush()
+
+    def read_key(self):
+        return self._keys.read_key()
+
+    def close(self):
+        self.flush()
+        # show cursor, leave alternate screen
+        os.write(self._fd_out, b"\033[?25h\033[?1049l")
+        self._keys.close()
+        self._termios.tcsetattr(self._fd_in, self._termios.TCSADRAIN, self._saved_mode)
@@ -0,0 +1,174 @@
+from collections import deque
+from datetime import datetime
+from queue import Empty, Queue
+
+from .cli import parser, prepare_args
+from .events import INPUT_EXIT, TIME_TICK
+from .modes import clock, countdown, schedule, stopwatch
+
+SIMULATION_START = 1767225600.0  # 2026-01-01 00:00:00 UTC
+
+
+class VirtualTimeSource:
+    """
+    A time source that only moves when told to. Metronomes don't get a
+    thread here, SimulatedUi delivers their ticks instead.
+    """
+
+    def __init__(self, start=SIMULATION_START):
+        self._time = start
+        self.metronomes = []
+
+    def time(self):
+        return self._time
+
+    def monotonic(self):
+        return self._time
+
+    def now(self, tz=None):
+        return datetime.fromtimestamp(self._time, tz)
+
+    def advance_to(self, timestamp):
+        self._time = max(self._time, timestamp)
+
+    def start_metronome(self, metronome):
+        self.metronomes.append(metronome)
+
+
+class SimulatedUi:
+    """
+    Stands in for Ui, recording frames instead of drawing them and
+    replaying scripted input instead of reading the keyboard. Time only
+    passes while the mode is waiting for input, jumping straight to the
+    next key, tick or timeout. Once the end of the simulation is reached,
+    the mode is told to exit.
+    """
+
+    def __init__(
+        self,
+        time_source,
+        until,
+        keys=(),
+        keep_frames=True,
+        probe=None,
+        probe_interval=3600,
+    ):
+        self.input_queue = Queue()
+        self.registration = None
+        self.state_feed = None
+        self.tracer = None
+        self.frames = []
+        self.frame_count = 0
+        self.wakeups = 0
+        self.beeps = 0
+        self.window_title = None
+        self._time_source = time_source
+        self._until = until
+        self._keys = deque(sorted(keys))
+        self._keep_frames = keep_frames
+        self._last_frame = None
+        self._exit_sent = False
+        self._probe = probe
+        self._probe_interval = probe_interval
+        self._next_probe = time_source.time() + probe_interval
+
+    def draw_text(self, text, color=0, end=None):
+        frame = (text, color, end or "")
+        if frame == self._last_frame:
+            return
+        self._last_frame = frame
+        self.frame_count += 1
+        if self._keep_frames:
+            self.frames.append((self._time_source.time(),) + frame)
+
+    def draw_grid(self, cells, color=0):
+        self.draw_text(cells, color=color)
+
+    def redraw(self):
+        pass
+
+    def beep(self):
+        self.beeps += 1
+
+    def set_window_title(self, text):
+        self.window_title = text
+
+    def get_input(self, timeout=None):
+        self.wakeups += 1
+        now = self._time_source.time()
+        due = [
+            metronome.next_tick_time(now)
+            for metronome in self._time_source.metronomes
+            if not metronome.is_paused and not metronome.is_stopped
+        ]
+        next_tick = min(due) if due else None
+        next_key = self._keys[0][0] if self._keys else None
+        deadline = None if timeout is None else now + timeout
+
+        upcoming = [
+            timestamp
+            for timestamp in (next_key, next_tick, deadline, self._until)
+            if timestamp is not None
+        ]
+        when = max(min(upcoming), now)
+        self._time_source.advance_to(when)
+
+        while self._probe is not None and when >= self._next_probe:
+            self._probe(self)
+            self._next_probe += self._probe_interval
+
+        if next_key is not None and when >= next_key:
+            return self._keys.popleft()[1]
+        elif next_tick is not None and when >= next_tick:
+            return TIME_TICK
+        elif deadline is not None and when >= deadline:
+            raise Empty
+        elif self._exit_sent:
+            raise RuntimeError("mode ignored INPUT_EXIT")
+        self._exit_sent = True
+        return INPUT_EXIT
+
+
+def simulate(
+    argv,
+    duration,
+    keys=(),
+    start=SIMULATION_START,
+    keep_frames=True,
+    probe=None,
+    probe_interval=3600,
+):
+    """
+    Runs termdown with the given command line arguments for duration
+    seconds of virtual time, which takes only as long as computing the
+    frames does. keys is an iterable of (seconds, event) tuples to feed
+    into the mode along the way, e.g. [(30, INPUT_PAUSE)].
+
+    If given, probe is called with the SimulatedUi every probe_interval
+    seconds of virtual time.
+
+    Returns the SimulatedUi and whatever the mode returned.
+    """
+    args = prepare_args(parser.parse_args(argv))
+    time_source = VirtualTimeSource(start)
+    ui = SimulatedUi(
+        time_source,
+        start + duration,
+        keys=((start + seconds, event) for seconds, event in keys),
+        keep_frames=keep_frames,
+        probe=probe,
+        probe_interval=probe_interval,
+    )
+    if args.time:
+        mode = clock
+    elif args.schedule:
+        mode = schedule
+    elif args.timespec:
+        mode = countdown
+    else:
+        mode = stopwatch
+    try:
+        result = mode(ui, args, time_source=time_source)
+    except SystemExit:  # cancelled countdown
+        result = None
+    return ui, result
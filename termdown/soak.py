@@ -0,0 +1,236 @@
+import os
+import sys
+import tracemalloc
+from argparse import REMAINDER, ArgumentParser
+from time import process_time
+
+from .events import INPUT_LAP
+from .simulation import simulate
+
+parser = ArgumentParser(
+    prog="python -m termdown.soak",
+    description="""
+    Runs termdown on accelerated time for days or months and fails if
+    memory, file descriptors, child processes or CPU time per tick grow
+    beyond the given budgets. Growth is measured from the first probe on,
+    so one-time allocations at startup don't count.""",
+    epilog="Example: python -m termdown.soak --days 60 --lap-every 600 -- -s",
+)
+parser.add_argument(
+    "--days", type=float, default=30, metavar="N", help="Simulated days (defaults to 30)"
+)
+parser.add_argument(
+    "--probe-interval",
+    type=int,
+    default=86400,
+    metavar="N",
+    help="Take measurements every N simulated seconds (defaults to a day)",
+)
+parser.add_argument(
+    "--lap-every",
+    type=int,
+    metavar="N",
+    help="Press L every N simulated seconds",
+)
+parser.add_argument(
+    "--rss-budget",
+    type=float,
+    default=10,
+    metavar="MB",
+    help="Allowed growth of the resident set size (defaults to 10)",
+)
+parser.add_argument(
+    "--memory-budget",
+    type=float,
+    default=1024,
+    metavar="KB",
+    help="Allowed growth of memory allocated by Python (defaults to 1024)",
+)
+parser.add_argument(
+    "--fd-budget",
+    type=int,
+    default=0,
+    metavar="N",
+    help="Allowed growth of open file descriptors (defaults to 0)",
+)
+parser.add_argument(
+    "--children-budget",
+    type=int,
+    default=2,
+    metavar="N",
+    help="Allowed number of child processes, running or not yet reaped (defaults to 2)",
+)
+parser.add_argument(
+    "--cpu-budget",
+    type=float,
+    default=1000,
+    metavar="US",
+    help="Allowed CPU time per tick in microseconds (defaults to 1000)",
+)
+parser.add_argument(
+    "termdown_args",
+    nargs=REMAINDER,
+    help="Arguments for termdown, after --",
+)
+
+
+def rss_bytes():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        import resource
+
+        # only the peak is available, which is good enough to spot growth
+        usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return usage if sys.platform == "darwin" else usage * 1024
+
+
+def open_fd_count():
+    for path in ("/proc/self/fd", "/dev/fd"):
+        try:
+            return len(os.listdir(path))
+        except OSError:
+            pass
+    return None
+
+
+def child_count():
+    """
+    Returns the number of child processes, including zombies, or None if
+    there is no /proc to look at.
+    """
+    pid = str(os.getpid())
+    try:
+        entries = os.listdir("/proc")
+    except OSError:
+        return None
+    count = 0
+    for entry in entries:
+        if not entry.isdigit():
+            continue
+        try:
+            with open("/proc/{}/stat".format(entry)) as f:
+                stat = f.read()
+        except OSError:
+            continue
+        # the command name may contain spaces, the ppid follows the state after it
+        if stat.rsplit(")", 1)[1].split()[1] == pid:
+            count += 1
+    return count
+
+
+class SoakProbe:
+    """
+    Collects one measurement per call, to be used as a simulation probe.
+    """
+
+    def __init__(self, probe_interval):
+        self.samples = []
+        self.first_snapshot = None
+        self._probe_interval = probe_interval
+        self._last_cpu = process_time()
+        self._last_wakeups = 0
+
+    def __call__(self, ui):
+        cpu = process_time()
+        wakeups = ui.wakeups - self._last_wakeups
+        self.samples.append(
+            {
+                "days": (len(self.samples) + 1) * self._probe_interval / 86400,
+                "rss": rss_bytes(),
+                "memory": tracemalloc.get_traced_memory()[0],
+                "fds": open_fd_count(),
+                "children": child_count(),
+                "cpu_per_tick": (cpu - self._last_cpu) / max(wakeups, 1),
+            }
+        )
+        if self.first_snapshot is None:
+            self.first_snapshot = tracemalloc.take_snapshot()
+        # don't bill the measurements to the next interval
+        self._last_cpu = process_time()
+        self._last_wakeups = ui.wakeups
+
+
+def check_budgets(samples, args):
+    """
+    Returns a list of budget violations, empty if everything is fine.
+    """
+    first, last = samples[0], samples[-1]
+    violations = []
+    rss_growth = (last["rss"] - first["rss"]) / 1024 / 1024
+    if rss_growth > args.rss_budget:
+        violations.append("RSS grew by {:.1f} MB".format(rss_growth))
+    memory_growth = (last["memory"] - first["memory"]) / 1024
+    if memory_growth > args.memory_budget:
+        violations.append("Python memory grew by {:.1f} KB".format(memory_growth))
+    if first["fds"] is not None and last["fds"] - first["fds"] > args.fd_budget:
+        violations.append(
+            "open file descriptors grew by {}".format(last["fds"] - first["fds"])
+        )
+    if first["children"] is not None:
+        children = max(sample["children"] for sample in samples)
+        if children > args.children_budget:
+            violations.append("up to {} child processes".format(children))
+    cpu_per_tick = max(sample["cpu_per_tick"] for sample in samples) * 1_000_000
+    if cpu_per_tick > args.cpu_budget:
+        violations.append("up to {:.0f} µs CPU time per tick".format(cpu_per_tick))
+    return violations
+
+
+def main():
+    args = parser.parse_args()
+    termdown_args = args.termdown_args
+    if termdown_args[:1] == ["--"]:
+        termdown_args = termdown_args[1:]
+    duration = args.days * 86400
+    if duration < 2 * args.probe_interval:
+        parser.error("--days must cover at least two probe intervals")
+
+    keys = []
+    if args.lap_every:
+        keys = [
+            (seconds, INPUT_LAP)
+            for seconds in range(args.lap_every, int(duration), args.lap_every)
+        ]
+
+    probe = SoakProbe(args.probe_interval)
+    tracemalloc.start()
+    ui, _ = simulate(
+        termdown_args,
+        duration,
+        keys=keys,
+        keep_frames=False,
+        probe=probe,
+        probe_interval=args.probe_interval,
+    )
+    last_snapshot = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+
+    print("days\tRSS MB\tPython KB\tFDs\tchildren\tCPU µs/tick")
+    for sample in probe.samples:
+        print(
+            "{:.2f}\t{:.1f}\t{:.1f}\t{}\t{}\t{:.1f}".format(
+                sample["days"],
+                sample["rss"] / 1024 / 1024,
+                sample["memory"] / 1024,
+                sample["fds"],
+                sample["children"],
+                sample["cpu_per_tick"] * 1_000_000,
+            )
+        )
+    print("{} frames, {} wakeups".format(ui.frame_count, ui.wakeups))
+
+    violations = check_budgets(probe.samples, args)
+    if violations:
+        print("\nBudget exceeded:", file=sys.stderr)
+        for violation in violations:
+            print("  " + violation, file=sys.stderr)
+        print("\nLargest allocations since the first probe:", file=sys.stderr)
+        for stat in last_snapshot.compare_to(probe.first_snapshot, "lineno")[:10]:
+            print("  {}".format(stat), file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
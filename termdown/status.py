@@ -0,0 +1,171 @@
+import os
+import stat
+import struct
+from time import time
+
+# This module is used by the --status fast path, so it must not import
+# curses, art, PIL or dateutil (not even indirectly).
+
+TITLE_SIZE = 64
+# version, mode, paused, pid, reference timestamp, frozen seconds, title
+RECORD = struct.Struct("<BBBxIdd{}s".format(TITLE_SIZE))
+RECORD_VERSION = 1
+MODES = ("clock", "countdown", "stopwatch", "schedule")
+COUNTDOWN_MODES = ("countdown", "schedule")
+RECORD_SUFFIX = ".state"
+
+
+def runtime_dir():
+    if os.environ.get("XDG_RUNTIME_DIR"):
+        return os.path.join(os.environ["XDG_RUNTIME_DIR"], "termdown")
+    from getpass import getuser
+    from tempfile import gettempdir
+
+    return os.path.join(gettempdir(), "termdown-{}".format(getuser()))
+
+
+def check_runtime_dir(directory):
+    """
+    Makes sure directory is a real directory only we can access, since
+    it may have a predictable path in a shared temp dir and another user
+    could have created it first.
+    """
+    if not hasattr(os, "getuid"):  # no POSIX permissions to check
+        return
+    info = os.lstat(directory)
+    if (
+        not stat.S_ISDIR(info.st_mode) or
+        info.st_uid != os.getuid() or
+        stat.S_IMODE(info.st_mode) != 0o700
+    ):
+        raise RuntimeError(
+            "Not a private directory owned by the current user: {}".format(directory)
+        )
+
+
+class Registration:
+    """
+    The state record of this instance. Countdowns record their target
+    timestamp, stopwatches the timestamp they were started at. Paused
+    instances also record the remaining/elapsed seconds at that moment,
+    everything else is left to the reader.
+    """
+
+    def __init__(self, mode, title=None):
+        self._mode = MODES.index(mode)
+        self._title = (title or "").encode()[:TITLE_SIZE]
+        self._last_state = None
+        directory = runtime_dir()
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+        check_runtime_dir(directory)
+        self._path = os.path.join(directory, "{}{}".format(os.getpid(), RECORD_SUFFIX))
+
+    def update(self, reference, paused, frozen_seconds):
+        # a stopwatch's reference is derived from monotonic() and will
+        # jitter a bit, don't rewrite the record for that
+        if self._last_state is not None:
+            last_reference, last_paused, last_frozen = self._last_state
+            if paused == last_paused and (
+                abs(frozen_seconds - last_frozen) < 0.01
+                if paused
+                else abs(reference - last_reference) < 0.01
+            ):
+                return
+        self._last_state = (reference, paused, frozen_seconds)
+        record = RECORD.pack(
+            RECORD_VERSION,
+            self._mode,
+            paused,
+            os.getpid(),
+            reference,
+            frozen_seconds,
+            self._title,
+        )
+        # write to a temporary file first so readers never see half a record
+        tmp_path = self._path + ".tmp"
+        flags = os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, "O_NOFOLLOW", 0)
+        try:
+            fd = os.open(tmp_path, flags, 0o600)
+        except FileExistsError:
+            # left behind by an earlier update that failed halfway
+            os.unlink(tmp_path)
+            fd = os.open(tmp_path, flags, 0o600)
+        with os.fdopen(fd, "wb") as f:
+            f.write(record)
+        os.replace(tmp_path, self._path)
+
+    def remove(self):
+        try:
+            os.unlink(self._path)
+        except FileNotFoundError:
+            pass
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:  # e.g. EPERM, or no signals on this platform
+        return True
+    return True
+
+
+def read_states():
+    """
+    Yields (pid, mode, paused, seconds, title) for all running instances,
+    with seconds being remaining/elapsed seconds as of now.
+    """
+    directory = runtime_dir()
+    try:
+        check_runtime_dir(directory)
+    except FileNotFoundError:
+        return
+    filenames = sorted(os.listdir(directory))
+    now = time()
+    for filename in filenames:
+        if not filename.endswith(RECORD_SUFFIX):
+            continue
+        path = os.path.join(directory, filename)
+        try:
+            with open(path, "rb") as f:
+                data = f.read(RECORD.size)
+        except FileNotFoundError:  # instance just exited
+            continue
+        if len(data) != RECORD.size:
+            continue
+        version, mode, paused, pid, reference, frozen, title = RECORD.unpack(data)
+        if version != RECORD_VERSION:
+            continue
+        if not _pid_alive(pid):
+            # left behind by an instance that didn't exit cleanly
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+            continue
+        mode = MODES[mode]
+        if paused:
+            seconds = frozen
+        elif mode in COUNTDOWN_MODES:
+            seconds = max(reference - now, 0)
+        else:
+            seconds = now - reference
+        title = title.rstrip(b"\0").decode(errors="replace")
+        yield pid, mode, bool(paused), seconds, title
+
+
+def print_status():
+    from .utils import format_seconds
+
+    for pid, mode, paused, seconds, title in read_states():
+        print(
+            "{}\t{}\t{}\t{:.3f}\t{}\t{}".format(
+                pid,
+                mode,
+                "paused" if paused else "running",
+                seconds,
+                format_seconds(seconds if mode in COUNTDOWN_MODES else round(seconds)),
+                title,
+            )
+        )
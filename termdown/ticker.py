@@ -1,52 +1,90 @@
 from math import ceil
-from threading import Thread
-from time import monotonic, sleep, time
+from threading import Event
 
-from .events import TIME_TICK
+from .events import TIME_TICK, EventRecord
+from .timesource import SYSTEM_TIME
 
 
 class Metronome:
     """
-    Will put a TIME_TICK event into the given queue every full second, delayed by offset.
+    Will put a TIME_TICK EventRecord into the given queue every full second, delayed by offset.
+    Ticks can be skipped by telling the metronome when the next one is actually needed.
     """
 
-    def __init__(self, queue, offset=0):
+    def __init__(self, queue, offset=0, time_source=SYSTEM_TIME):
         self._offset = offset
         self._queue = queue
-        self._thread = Thread(target=self._run, daemon=True)
+        self._time_source = time_source
         self._pause_time = None
+        self._wakeup_time = None
+        self._rescheduled = Event()
+        self._stopped = False
 
-    def _run(self):
-        while True:
-            # Calculate the time to sleep until the next full second
-            current_time = time()
-            target_time = ceil(current_time) + self._offset
-            sleep_time = target_time - current_time
+    def next_tick_time(self, current_time):
+        """
+        Returns the time() value at which the next tick is due.
+        """
+        # Calculate the time until the next full second
+        target_time = ceil(current_time - self._offset) + self._offset
 
-            # If sleep_time is very small (e.g., we're just before the second),
-            # we should wait for the next second.
-            if sleep_time < 0.001:  # Small buffer to avoid missing the second
-                sleep_time += 1.0
+        # If that is very close (e.g., we're just before the second),
+        # we should wait for the next second. The small buffer keeps us
+        # from missing the second.
+        if target_time - current_time < 0.001:
+            target_time += 1.0
 
-            sleep(sleep_time)
-            if not self.is_paused:
-                self._queue.put(TIME_TICK)
+        wakeup_time = self._wakeup_time
+        if wakeup_time is not None and wakeup_time > target_time:
+            # Skip whole seconds, but stay on our grid so we don't wake
+            # up a hair before the display actually changes.
+            target_time += ceil(wakeup_time - target_time - 0.001)
+        return target_time
+
+    def run(self):
+        while not self._stopped:
+            current_time = self._time_source.time()
+            target_time = self.next_tick_time(current_time)
+            if self._rescheduled.wait(target_time - current_time):
+                self._rescheduled.clear()
+                continue
+            if not self.is_paused and not self._stopped:
+                self._queue.put(EventRecord(TIME_TICK, "metronome"))
 
     def start(self):
-        self._thread.start()
+        self._time_source.start_metronome(self)
+
+    def stop(self):
+        """
+        Stops ticking for good and lets the thread exit.
+        """
+        self._stopped = True
+        self._rescheduled.set()
+
+    def sleep_until(self, wakeup_time):
+        """
+        Don't tick again before the given time() value. The tick will be
+        delivered on the first full second (plus offset) at or after it.
+        """
+        self._wakeup_time = wakeup_time
+        self._rescheduled.set()
 
     def pause(self):
         if self.is_paused:  # unpause
-            duration = monotonic() - self._pause_time
+            duration = self._time_source.monotonic() - self._pause_time
             self._pause_time = None
             if self._offset is not None:
                 # If we're not running in clock mode, change the offset so the
                 # next tick will be 1s from now.
-                self._offset = time() % 1.0
+                self._offset = self._time_source.time() % 1.0
+            self._rescheduled.set()
             return duration
         else:  # pause
-            self._pause_time = monotonic()
+            self._pause_time = self._time_source.monotonic()
 
     @property
     def is_paused(self):
         return self._pause_time is not None
+
+    @property
+    def is_stopped(self):
+        return self._stopped
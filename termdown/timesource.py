@@ -0,0 +1,25 @@
+from datetime import datetime
+from threading import Thread
+from time import monotonic, time
+
+
+class SystemTimeSource:
+    """
+    Where the modes, the Metronome and parse_timestr() get the current
+    time from. See termdown.simulation for a virtual replacement.
+    """
+
+    def time(self):
+        return time()
+
+    def monotonic(self):
+        return monotonic()
+
+    def now(self, tz=None):
+        return datetime.now(tz)
+
+    def start_metronome(self, metronome):
+        Thread(target=metronome.run, daemon=True).start()
+
+
+SYSTEM_TIME = SystemTimeSource()
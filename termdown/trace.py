@@ -0,0 +1,70 @@
+import json
+import os
+from math import ceil
+
+from .events import EVENT_NAMES
+
+PERCENTILES = (50, 90, 99, 100)
+
+
+def percentile(values, pct):
+    """
+    Returns the given percentile of a sorted list using the nearest-rank
+    method.
+    """
+    return values[max(int(ceil(pct / 100 * len(values))) - 1, 0)]
+
+
+class Tracer:
+    """
+    Collects the latency between the creation of events and the paint of
+    the frame showing their effect, and saves them as a Chrome trace file
+    (see chrome://tracing or https://ui.perfetto.dev).
+    """
+
+    def __init__(self, path):
+        self._path = path
+        self._events = []
+
+    def record(self, event):
+        self._events.append(event)
+
+    def latency_percentiles(self):
+        latencies = {}
+        for event in self._events:
+            latencies.setdefault(event.source, []).append(event.painted - event.created)
+        result = {}
+        for source, values in latencies.items():
+            values.sort()
+            result[source] = {
+                "p{}".format(pct): round(percentile(values, pct) * 1000, 3)
+                for pct in PERCENTILES
+            }
+            result[source]["count"] = len(values)
+        return result
+
+    def save(self):
+        pid = os.getpid()
+        trace_events = [
+            {
+                "name": EVENT_NAMES[event.kind],
+                "cat": event.source,
+                "ph": "X",
+                "ts": event.created * 1_000_000,
+                "dur": (event.painted - event.created) * 1_000_000,
+                "pid": pid,
+                "tid": 0,
+            }
+            for event in self._events
+        ]
+        with open(self._path, "w") as f:
+            json.dump(
+                {
+                    "traceEvents": trace_events,
+                    "displayTimeUnit": "ms",
+                    "otherData": {
+                        "latency_ms": self.latency_percentiles(),
+                    },
+                },
+                f,
+            )
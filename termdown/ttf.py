@@ -38,3 +38,17 @@ def ttf_to_ascii(text, font_path, font_size, char_set):
         lines.append("".join(line))
 
     return "\n".join(lines)
+
+
+def ttf_text_size(text, font_path, font_size):
+    """
+    Returns the width and height (in characters) that ttf_to_ascii() would
+    produce for the given text, without actually rendering it.
+    """
+    try:
+        font = ImageFont.truetype(font_path, font_size)
+    except IOError:
+        raise RuntimeError(f"Error: Could not load font from {font_path}")
+
+    bbox = ImageDraw.Draw(Image.new("L", (1, 1))).textbbox((0, 0), text, font=font)
+    return bbox[2] - bbox[0], bbox[3] - bbox[1]
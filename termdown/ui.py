@@ -1,12 +1,21 @@
-import curses
 import os
+from functools import partial
+from math import ceil
 from queue import Queue
-from sys import stdout
 from threading import Lock, Thread
-from time import sleep
+from time import monotonic, perf_counter, sleep
 
 from art import text2art
 
+from .autosize import (
+    DIGIT_REGEX,
+    FIGLET_FONTS,
+    figlet_text_size,
+    fit_figlet_font,
+    fit_ttf_size,
+    longest_text,
+    widest_text,
+)
 from .events import (
     INPUT_END,
     INPUT_EXIT,
@@ -15,30 +24,56 @@ from .events import (
     INPUT_PAUSE,
     INPUT_PLUS,
     INPUT_RESET,
+    WINDOW_RESIZE,
+    EventRecord,
 )
+from .renderers import DEFAULT_COLOR
+from .trace import Tracer
 from .ttf import ttf_to_ascii
-from .utils import pad_to_size
+from .utils import arrange_in_grid, pad_to_size
+
+# for rendered art and layout choices
+CACHE_SIZE = 64
+# between the columns of a grid
+GRID_GAP = 4
+# (foreground, background), numbered as in curses
+COLOR_PAIRS = {
+    1: (1, DEFAULT_COLOR),  # red
+    2: (1, 1),  # red on red
+    3: (4, DEFAULT_COLOR),  # blue
+    4: (DEFAULT_COLOR, 1),  # on red
+}
+
+
+def _remember(cache, key, value):
+    if key not in cache and len(cache) >= CACHE_SIZE:
+        # dicts keep insertion order, so this drops the oldest entry
+        del cache[next(iter(cache))]
+    cache[key] = value
 
 
 class Ui:
-    def __init__(self, stdscr, args):
-        self.curses_lock = Lock()
+    def __init__(self, renderer, args):
+        # only writes to the terminal are serialized, frames are composed
+        # without holding it
+        self._terminal_lock = Lock()
         self.input_queue = Queue()
-        self.stdscr = stdscr
+        self.renderer = renderer
         self._args = args
+        self._last_frame = None
+        self._last_window_title = None
+        self._art_cache = {}
+        self._layout_cache = {}
+        self._auto_size_cache = {}
+        self._longest_text = None
+        self._unpainted_events = []
+        self.tracer = Tracer(args.trace_file) if args.trace_file else None
+        self.registration = None
+        self.state_feed = None
 
-        curses.use_default_colors()
-        curses.init_pair(1, curses.COLOR_RED, -1)
-        curses.init_pair(2, curses.COLOR_RED, curses.COLOR_RED)
-        curses.init_pair(3, curses.COLOR_BLUE, -1)
-        curses.init_pair(4, -1, curses.COLOR_RED)
-        try:
-            curses.curs_set(False)
-        except curses.error:
-            # fails on some terminals
-            pass
-        stdscr.timeout(0)  # Set timeout for getch/getkey to 0 (non-blocking)
-        stdscr.nodelay(True)  # Set nodelay mode (also non-blocking)
+        color_pairs = dict(COLOR_PAIRS)
+        color_pairs.update(args.color_table.color_pairs)
+        renderer.init_colors(color_pairs)
 
     def draw_text(self, text, color=0, end=None):
         """
@@ -48,55 +83,276 @@ class Ui:
         title = self._args.title or ""
         end = end or ""
 
-        # build a list of possible fallbacks in descending order of preference
+        # nothing to do if the screen would look exactly like it does now
+        frame = ("draw_text", (text, color, end), self.renderer.size(), title)
+        if frame == self._last_frame:
+            self._mark_painted()
+            return
+        self._last_frame = frame
+
+        y, x = self.renderer.size()
+        style = None if self._args.no_art else self._art_style(text)
+
+        def art(text):
+            return self._render_art(text, *style)
+
+        # possible fallbacks in descending order of preference, built
+        # only when needed
         variants = [
-            (title + "\n\n" + text + "\n\n" + end).strip("\n"),
-            (title + "\n\n" + text).strip("\n"),
-            text,
-            "E",
+            lambda: title + "\n\n" + text + "\n\n" + end,
+            lambda: title + "\n\n" + text,
+            lambda: text,
+            lambda: "E",
         ]
+        if style is not None:
+            variants = [
+                lambda: art(title) + "\n\n\n\n" + art(text) + "\n\n\n\n" + art(end),
+                lambda: art(title) + "\n\n" + art(text) + "\n\n" + art(end),
+                lambda: art(title) + "\n\n" + art(text) + "\n\n" + end,
+                lambda: title + "\n\n" + art(text) + "\n\n" + end,
+            ] + variants
+
+        # digits don't change the layout (much), so the choice made for
+        # the previous second is the place to start for this one
+        key = (
+            "draw_text",
+            DIGIT_REGEX.sub("0", text),
+            DIGIT_REGEX.sub("0", end),
+            title,
+            style,
+            y,
+            x,
+        )
+        index, lines = self._compose(key, variants, y, x)
+        with self._terminal_lock:
+            try:
+                self.renderer.draw(lines, color)
+            except Exception:
+                # curses didn't like it after all, try the smaller variants
+                for variant in variants[index + 1:]:
+                    try:
+                        self.renderer.draw(self._pad(variant(), y, x), color)
+                    except Exception:
+                        continue
+                    else:
+                        break
+            self.renderer.flush()
+        self._mark_painted()
+
+    def _mark_painted(self):
+        """
+        Stamps all events handled since the last frame with the current
+        time, since their effect is now visible.
+        """
+        if self.tracer is None:
+            return
+        now = perf_counter()
+        for event in self._unpainted_events:
+            event.painted = now
+            self.tracer.record(event)
+        self._unpainted_events.clear()
+
+    def draw_grid(self, cells, color=0):
+        """
+        Draws a grid of (label, text) cells, e.g. for the world clock.
+        """
+        frame = ("draw_grid", (cells, color), self.renderer.size(), None)
+        if frame == self._last_frame:
+            self._mark_painted()
+            return
+        self._last_frame = frame
+
+        y, x = self.renderer.size()
+
+        def grid(style):
+            if style is None:
+                return arrange_in_grid(
+                    [label + "\n" + text for label, text in cells], x, GRID_GAP
+                )
+            return arrange_in_grid(
+                [
+                    label + "\n\n" + self._render_art(text, *style)
+                    for label, text in cells
+                ],
+                x,
+                GRID_GAP,
+            )
+
+        # possible fallbacks in descending order of preference: art in the
+        # font that fits a cell, in each smaller figlet font, then plain
+        styles = [] if self._args.no_art else self._grid_art_styles(cells, y, x)
+        variants = [partial(grid, style) for style in styles + [None]]
+        variants.append(lambda: "E")
+
+        key = (
+            "draw_grid",
+            tuple((label, DIGIT_REGEX.sub("0", text)) for label, text in cells),
+            tuple(styles[:1]),
+            y,
+            x,
+        )
+        lines = self._compose(key, variants, y, x)[1]
+        with self._terminal_lock:
+            self.renderer.draw(lines, color)
+            self.renderer.flush()
+        self._mark_painted()
+
+    def redraw(self):
+        """
+        Draws the last frame again, e.g. after the terminal was resized.
+        """
+        if self._last_frame is None:
+            return
+        method, args = self._last_frame[:2]
+        self._last_frame = None
+        with self._terminal_lock:
+            self.renderer.force_redraw()
+        getattr(self, method)(*args)
 
-        if not self._args.no_art:
+    def _render_art(self, text, font, font_size):
+        key = (text, font, font_size)
+        if key not in self._art_cache:
+            if os.path.exists(font):
+                art = ttf_to_ascii(text, font, font_size, self._args.font_charset)
+            else:
+                art = text2art(text, font=font)
+            _remember(self._art_cache, key, art)
+        return self._art_cache[key]
+
+    def _art_style(self, text):
+        """
+        Returns the font and font size to render text in. With --auto-size,
+        this is the largest one that fits the longest text the mode will
+        show into the terminal, leaving room for a plain title and end
+        text. Only texts longer than that get a size of their own.
+        """
+        if not self._args.auto_size:
+            return self._args.font, self._args.font_size
+        if self._longest_text is None:
+            self._longest_text = longest_text(self._args)
+        y, x = self.renderer.size()
+        if len(text) > len(self._longest_text):
+            shape = DIGIT_REGEX.sub("0", text)
+        else:
+            shape = DIGIT_REGEX.sub("0", self._longest_text)
+        key = (y, x, shape)
+        if key not in self._auto_size_cache:
+            rows = y
+            if self._args.title:
+                rows -= self._args.title.count("\n") + 3
+            if self._args.timespec and not self._args.time:
+                rows -= 3  # room for --end
             if os.path.exists(self._args.font):
-                ttf_args = (
+                self._auto_size_cache[key] = (
                     self._args.font,
-                    self._args.font_size,
-                    self._args.font_charset,
+                    fit_ttf_size(shape, self._args.font, rows, x),
                 )
-                art_title = ttf_to_ascii(title, *ttf_args)
-                art_text = ttf_to_ascii(text, *ttf_args)
-                art_end = ttf_to_ascii(end, *ttf_args)
             else:
-                art_title = text2art(title, font=self._args.font)
-                art_text = text2art(text, font=self._args.font)
-                art_end = text2art(end, font=self._args.font)
-            variants = [
-                (art_title + "\n\n\n\n" + art_text + "\n\n\n\n" + art_end).strip("\n"),
-                (art_title + "\n\n" + art_text + "\n\n" + art_end).strip("\n"),
-                (art_title + "\n\n" + art_text + "\n\n" + end).strip("\n"),
-                (title + "\n\n" + art_text + "\n\n" + end).strip("\n"),
-            ] + variants
+                self._auto_size_cache[key] = (
+                    fit_figlet_font(shape, FIGLET_FONTS + (self._args.font,), rows, x)
+                    or self._args.font,
+                    self._args.font_size,
+                )
+        return self._auto_size_cache[key]
 
-        y, x = self.stdscr.getmaxyx()
-        for variant in variants:
-            lines = pad_to_size(variant, x, y).rstrip("\n").split("\n")
-            self.stdscr.erase()
-            try:
-                for i, line in enumerate(lines):
-                    self.stdscr.insstr(i, 0, line, curses.color_pair(color))
-            except Exception:
+    def _grid_art_styles(self, cells, y, x):
+        """
+        Returns the fonts and font sizes to try for a grid of cells,
+        largest first. With --auto-size, the first one is the largest
+        that fits the text of a cell into its share of the terminal for
+        any number of columns.
+        """
+        font, font_size = self._args.font, self._args.font_size
+        if self._args.auto_size:
+            longest = max(sorted(text for _, text in cells), key=len)
+            shape = DIGIT_REGEX.sub("0", longest)
+            key = ("draw_grid", y, x, len(cells), shape)
+            if key not in self._auto_size_cache:
+                self._auto_size_cache[key] = self._fit_grid(shape, len(cells), y, x)
+            font, font_size = self._auto_size_cache[key]
+        styles = [(font, font_size)]
+        smaller = FIGLET_FONTS
+        if font in FIGLET_FONTS:
+            smaller = FIGLET_FONTS[FIGLET_FONTS.index(font) + 1:]
+        styles.extend((figlet_font, font_size) for figlet_font in smaller)
+        return styles
+
+    def _fit_grid(self, shape, count, y, x):
+        best, best_area = (self._args.font, self._args.font_size), 0
+        for columns in range(1, count + 1):
+            rows = ceil(count / columns)
+            # one blank line between rows, label and a blank line in a cell
+            cell_rows = (y + 1) // rows - 1 - 2
+            cell_cols = (x + GRID_GAP) // columns - GRID_GAP
+            if cell_rows < 1 or cell_cols < 1:
                 continue
+            if os.path.exists(self._args.font):
+                style = (
+                    self._args.font,
+                    fit_ttf_size(shape, self._args.font, cell_rows, cell_cols),
+                )
+                area = style[1]
             else:
+                fonts = FIGLET_FONTS + (self._args.font,)
+                figlet_font = fit_figlet_font(shape, fonts, cell_rows, cell_cols)
+                if figlet_font is None:
+                    continue
+                style = (figlet_font, self._args.font_size)
+                width, height = figlet_text_size(
+                    widest_text(shape, partial(figlet_text_size, font=figlet_font)),
+                    figlet_font,
+                )
+                area = width * height
+            if area > best_area:
+                best, best_area = style, area
+        return best
+
+    def _compose(self, key, variants, y, x):
+        """
+        Builds the variants in order until one fits into a terminal of
+        the given size, starting at the one that was chosen for key last
+        time. Returns its index and its lines, padded to the terminal.
+        """
+        start = self._layout_cache.get(key, 0)
+        for index in range(start, len(variants)):
+            text = variants[index]().strip("\n")
+            lines = text.split("\n")
+            if len(lines) <= y and max(len(line) for line in lines) <= x:
                 break
+        _remember(self._layout_cache, key, index)
+        return index, self._pad(text, y, x)
 
-        self.stdscr.refresh()
+    def _pad(self, text, y, x):
+        return pad_to_size(text.strip("\n"), x, y).rstrip("\n").split("\n")
+
+    def get_input(self, timeout=None):
+        """
+        Returns the next event from the input queue, taking care of
+        terminal resizes on the way. Raises queue.Empty on timeout.
+        """
+        # resizes must not push the deadline back
+        deadline = None if timeout is None else monotonic() + timeout
+        while True:
+            if deadline is not None:
+                timeout = max(deadline - monotonic(), 0)
+            event = self.input_queue.get(timeout=timeout)
+            if self.tracer is not None:
+                self._unpainted_events.append(event)
+            if event.kind != WINDOW_RESIZE:
+                return event.kind
+            with self._terminal_lock:
+                self.renderer.resize()
+            self.redraw()
+
+    def beep(self):
+        with self._terminal_lock:
+            self.renderer.beep()
 
     def set_window_title(self, text):
-        if not self._args.no_window_title:
-            os.write(
-                stdout.fileno(),
-                "\033]2;{0}\007".format(text).encode(),
-            )
+        if not self._args.no_window_title and text != self._last_window_title:
+            self._last_window_title = text
+            with self._terminal_lock:
+                self.renderer.set_title(text)
 
     def start_input_thread(self):
         Thread(
@@ -106,23 +362,32 @@ class Ui:
 
     def _input_thread_body(self):
         while True:
+            # Blocking renderers read keys without touching the terminal
+            # state, so they don't need the lock and a slow frame can't
+            # delay keys. The others are polled under the lock.
             try:
-                with self.curses_lock:
-                    key = self.stdscr.getkey()
+                if self.renderer.blocking_input:
+                    key = self.renderer.read_key()
+                else:
+                    with self._terminal_lock:
+                        key = self.renderer.read_key()
             except Exception:
                 key = None
+            if key is None:
+                sleep(0.01)
             if key in ("q", "Q"):
-                self.input_queue.put(INPUT_EXIT)
+                self.input_queue.put(EventRecord(INPUT_EXIT, "keyboard"))
             elif key == " ":
-                self.input_queue.put(INPUT_PAUSE)
+                self.input_queue.put(EventRecord(INPUT_PAUSE, "keyboard"))
             elif key in ("e", "E"):
-                self.input_queue.put(INPUT_END)
+                self.input_queue.put(EventRecord(INPUT_END, "keyboard"))
             elif key in ("r", "R"):
-                self.input_queue.put(INPUT_RESET)
+                self.input_queue.put(EventRecord(INPUT_RESET, "keyboard"))
             elif key in ("l", "L"):
-                self.input_queue.put(INPUT_LAP)
+                self.input_queue.put(EventRecord(INPUT_LAP, "keyboard"))
             elif key == "+":
-                self.input_queue.put(INPUT_PLUS)
+                self.input_queue.put(EventRecord(INPUT_PLUS, "keyboard"))
             elif key == "-":
-                self.input_queue.put(INPUT_MINUS)
-            sleep(0.01)
+                self.input_queue.put(EventRecord(INPUT_MINUS, "keyboard"))
+            elif key == "KEY_RESIZE":
+                self.input_queue.put(EventRecord(WINDOW_RESIZE, "terminal"))
@@ -1,10 +1,11 @@
 import re
 import unicodedata
 from datetime import datetime, timedelta, timezone
+from datetime import time as dt_time
+from functools import lru_cache
 from math import ceil
 
-from dateutil import tz
-from dateutil.parser import parse
+from .timesource import SYSTEM_TIME
 
 NORMALIZE_TEXT_MAP = {
     "ä": "ae",
@@ -22,12 +23,44 @@ TIMEDELTA_REGEX = re.compile(
     r"((?P<minutes>\d+)m ?)?"
     r"((?P<seconds>\d+)s ?)?"
 )
+# like TIMEDELTA_REGEX, but allows fractions and must match the whole string
+FAST_TIMEDELTA_REGEX = re.compile(
+    r"((?P<years>\d*\.?\d+)y ?)?"
+    r"((?P<days>\d*\.?\d+)d ?)?"
+    r"((?P<hours>\d*\.?\d+)h ?)?"
+    r"((?P<minutes>\d*\.?\d+)m ?)?"
+    r"((?P<seconds>\d*\.?\d+)s?)?"
+)
+TIMEDELTA_UNIT_SECONDS = {
+    "years": 8766 * 3600,
+    "days": 86400,
+    "hours": 3600,
+    "minutes": 60,
+    "seconds": 1,
+}
+TIMEZONE_SUFFIX = r"(?P<tz>Z| ?UTC|[+-]\d{2}:?\d{2})?"
+TIME_OF_DAY_REGEX = re.compile(
+    r"(?P<hour>\d{1,2}):(?P<minute>\d{2})(:(?P<second>\d{2}))?" + TIMEZONE_SUFFIX
+)
+ISO_DATETIME_REGEX = re.compile(
+    r"(?P<year>\d{4})-(?P<month>\d{2})-(?P<day>\d{2})"
+    r"([T ](?P<hour>\d{2}):(?P<minute>\d{2})"
+    r"(:(?P<second>\d{2})(\.(?P<fraction>\d{1,6}))?)?" + TIMEZONE_SUFFIX + r")?"
+)
+TIMESPEC_RELATIVE = "relative"
+TIMESPEC_ABSOLUTE = "absolute"
+TIMESPEC_TIME_OF_DAY = "time of day"
 DATE_COMPONENT_REGEX = re.compile(
     r"\d{4}|"  # year
     r"jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec|"
     r"\d{1,2}[/\-]\d{1,2}",  # day/month with separator
     re.IGNORECASE,
 )
+STRFTIME_DIRECTIVE_REGEX = re.compile(r"%[-_0^#]*(.)")
+STRFTIME_RESOLUTIONS = (
+    (1, set("cfrsSTX+")),
+    (60, set("MR")),
+)
 
 
 def format_seconds(seconds, hide_seconds=False):
@@ -76,19 +109,34 @@ def format_seconds_alt(seconds, hide_seconds=False):
     return output.rstrip(":")
 
 
-def format_target(target, time_format, date_format):
+def format_target(target, time_format, date_format, time_source=SYSTEM_TIME):
     """
     Returns a human-readable string representation of the countdown's target
     datetime. Converts UTC target to local time for display.
     """
+    from dateutil import tz  # slow to import, not needed for termdown --status
+
     target = target.astimezone(tz.tzlocal())
-    if datetime.now().date() != target.date():
+    if time_source.now().date() != target.date():
         fmt = "{} {}".format(date_format, time_format)
     else:
         fmt = time_format
     return target.strftime(fmt)
 
 
+def strftime_resolution(time_format):
+    """
+    Returns the number of seconds between changes in the output of the
+    given strftime format. Anything coarser than an hour is reported as
+    an hour so date and DST changes are still picked up in time.
+    """
+    directives = set(STRFTIME_DIRECTIVE_REGEX.findall(time_format))
+    for resolution, resolution_directives in STRFTIME_RESOLUTIONS:
+        if directives & resolution_directives:
+            return resolution
+    return 3600
+
+
 def normalize_text(input_str):
     for char, replacement in NORMALIZE_TEXT_MAP.items():
         input_str = input_str.replace(char, replacement)
@@ -123,38 +171,160 @@ def pad_to_size(text, x, y):
     return output
 
 
-def parse_timestr(timestr):
+def arrange_in_grid(cells, width, gap=4):
     """
-    Parse a string describing a point in time.
-    Returns a timezone-aware datetime in UTC to avoid issues with DST changes.
+    Arranges multi-line texts in a grid of equally sized cells, with as
+    many columns as fit into width.
     """
-    timedelta_secs = parse_timedelta(timestr)
+    cells = [cell.split("\n") for cell in cells]
+    cell_width = max(len(line) for cell in cells for line in cell)
+    cell_height = max(len(cell) for cell in cells)
+    columns = max(1, (width + gap) // (cell_width + gap))
+    rows = []
+    for row_start in range(0, len(cells), columns):
+        row = cells[row_start:row_start + columns]
+        for i in range(cell_height):
+            rows.append(
+                (" " * gap).join(
+                    (cell[i] if i < len(cell) else "").center(cell_width)
+                    for cell in row
+                ).rstrip()
+            )
+        rows.append("")
+    return "\n".join(rows).strip("\n")
+
+
+def _timezone_from_suffix(suffix):
+    if suffix is None:
+        return None
+    suffix = suffix.strip()
+    if suffix in ("Z", "UTC"):
+        return timezone.utc
+    sign = -1 if suffix[0] == "-" else 1
+    digits = suffix[1:].replace(":", "")
+    return timezone(
+        sign * timedelta(hours=int(digits[:2]), minutes=int(digits[2:]))
+    )
+
+
+def _parse_timespec_fast(timestr):
+    """
+    Handles the most common forms of TIME without dateutil. Returns an
+    intent tuple (see timespec_intent()) or None if timestr is anything
+    else.
+    """
+    timestr = timestr.strip()
+    match = FAST_TIMEDELTA_REGEX.fullmatch(timestr)
+    if match and timestr:
+        seconds = 0.0
+        for name, value in match.groupdict().items():
+            if value:
+                seconds += float(value) * TIMEDELTA_UNIT_SECONDS[name]
+        return TIMESPEC_RELATIVE, seconds
+
+    try:
+        match = TIME_OF_DAY_REGEX.fullmatch(timestr)
+        if match:
+            return TIMESPEC_TIME_OF_DAY, dt_time(
+                int(match["hour"]),
+                int(match["minute"]),
+                int(match["second"] or 0),
+                tzinfo=_timezone_from_suffix(match["tz"]),
+            )
+        match = ISO_DATETIME_REGEX.fullmatch(timestr)
+        if match:
+            target = datetime(
+                int(match["year"]),
+                int(match["month"]),
+                int(match["day"]),
+                int(match["hour"] or 0),
+                int(match["minute"] or 0),
+                int(match["second"] or 0),
+                int((match["fraction"] or "0").ljust(6, "0")),
+                tzinfo=_timezone_from_suffix(match["tz"]),
+            )
+            # naive datetimes are local time
+            return TIMESPEC_ABSOLUTE, target.astimezone(timezone.utc)
+    except ValueError:  # e.g. 25:00, let dateutil produce the error
+        pass
+    return None
+
 
+def _parse_timespec_slow(timestr, today):
+    timedelta_secs = parse_timedelta(timestr)
     if timedelta_secs:
-        target = datetime.now(timezone.utc) + timedelta(seconds=timedelta_secs)
+        return TIMESPEC_RELATIVE, timedelta_secs
     elif timestr.isdigit():
-        target = datetime.now(timezone.utc) + timedelta(seconds=int(timestr))
-    else:
-        try:
-            target = parse(timestr)
-        except Exception:
-            # unfortunately, dateutil doesn't raise the best exceptions
-            raise ValueError("Unable to parse '{}'".format(timestr))
-        if target.tzinfo is None:
-            target = target.replace(tzinfo=tz.tzlocal())
-        target = target.astimezone(timezone.utc)
-
-        if (
-            target <= datetime.now(timezone.utc) and
-            not DATE_COMPONENT_REGEX.search(timestr)
-        ):
-            # User only gave us a time and it's in the past - probably
-            # means that time tomorrow.
-            target += timedelta(days=1)
+        return TIMESPEC_RELATIVE, int(timestr)
+
+    from dateutil import tz  # slow to import, not needed for termdown --status
+    from dateutil.parser import parse
+
+    try:
+        # dateutil fills in missing fields from today at midnight
+        target = parse(timestr, default=datetime.combine(today, dt_time()))
+    except Exception:
+        # unfortunately, dateutil doesn't raise the best exceptions
+        raise ValueError("Unable to parse '{}'".format(timestr))
+    if target.date() == today and not DATE_COMPONENT_REGEX.search(timestr):
+        return TIMESPEC_TIME_OF_DAY, target.timetz()
+    if target.tzinfo is None:
+        target = target.replace(tzinfo=tz.tzlocal())
+    return TIMESPEC_ABSOLUTE, target.astimezone(timezone.utc)
+
 
+@lru_cache(maxsize=128)
+def _parse_timespec(timestr, today):
+    return _parse_timespec_fast(timestr) or _parse_timespec_slow(timestr, today)
+
+
+def timespec_intent(timestr, time_source=SYSTEM_TIME):
+    """
+    Parse a string describing a point in time without resolving it yet.
+    Returns one of these tuples:
+
+        (TIMESPEC_RELATIVE, seconds from now)
+        (TIMESPEC_ABSOLUTE, timezone-aware datetime in UTC)
+        (TIMESPEC_TIME_OF_DAY, time, naive if local)
+
+    Results are cached, so asking again (e.g. on reset) is cheap.
+    """
+    return _parse_timespec(timestr, time_source.now().date())
+
+
+def resolve_timespec(intent, time_source=SYSTEM_TIME):
+    """
+    Turns the result of timespec_intent() into a timezone-aware datetime
+    in UTC.
+    """
+    kind, value = intent
+    now = time_source.now(timezone.utc)
+    if kind == TIMESPEC_RELATIVE:
+        return now + timedelta(seconds=value)
+    elif kind == TIMESPEC_ABSOLUTE:
+        return value
+
+    # naive datetimes are local time
+    target = datetime.combine(time_source.now().date(), value).astimezone(
+        timezone.utc
+    )
+    if target <= now:
+        # User only gave us a time and it's in the past - probably
+        # means that time tomorrow.
+        target += timedelta(days=1)
     return target
 
 
+def parse_timestr(timestr, time_source=SYSTEM_TIME):
+    """
+    Parse a string describing a point in time.
+    Returns a timezone-aware datetime in UTC to avoid issues with DST changes.
+    """
+    return resolve_timespec(
+        timespec_intent(timestr, time_source=time_source), time_source=time_source
+    )
+
+
 def parse_timedelta(deltastr):
     """
     Parse a string describing a period of time.
@@ -173,3 +343,66 @@ def parse_timedelta(deltastr):
             )
             del components[period]
     return int(timedelta(**components).total_seconds())
+
+
+def parse_schedule(path, time_source=SYSTEM_TIME):
+    """
+    Parse an agenda file with one segment per line:
+
+        TIME [| TITLE [| TEXT]]
+
+    Blank lines and lines starting with # are ignored. Durations count
+    from the end of the previous segment (the first one from now), so
+    the whole agenda is pinned to the wall clock up front. Since every
+    segment starts right when the previous one ends, only the last one
+    may have a TEXT to show once it's over.
+    Returns a list of (target datetime in UTC, title, text) tuples.
+    """
+    with open(path) as f:
+        lines = f.read().splitlines()
+
+    segments = []
+    previous_target = time_source.now(timezone.utc)
+    text_line_number = None
+    for line_number, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        if text_line_number is not None:
+            raise RuntimeError(
+                "{}:{}: only the last segment can have a TEXT".format(
+                    path, text_line_number
+                )
+            )
+        fields = [field.strip() for field in line.split("|", 2)]
+        fields += [None] * (3 - len(fields))
+        timestr, title, text = fields
+
+        try:
+            intent = timespec_intent(timestr, time_source=time_source)
+        except ValueError:
+            raise RuntimeError(
+                "{}:{}: unable to parse '{}'".format(path, line_number, timestr)
+            )
+        if intent[0] == TIMESPEC_RELATIVE:
+            target = previous_target + timedelta(seconds=intent[1])
+        else:
+            target = resolve_timespec(intent, time_source=time_source)
+            if intent[0] == TIMESPEC_TIME_OF_DAY:
+                # a time of day after midnight belongs to the next day
+                while target < previous_target:
+                    target += timedelta(days=1)
+        if target < previous_target:
+            raise RuntimeError(
+                "{}:{}: '{}' is before the previous segment".format(
+                    path, line_number, timestr
+                )
+            )
+        segments.append((target, title or None, text or None))
+        previous_target = target
+        if text:
+            text_line_number = line_number
+
+    if not segments:
+        raise RuntimeError("No segments in {}".format(path))
+    return segments
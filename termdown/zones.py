@@ -0,0 +1,92 @@
+from datetime import timedelta, timezone
+
+ONE_SECOND = timedelta(seconds=1)
+ONE_DAY = timedelta(days=1)
+# if there's no transition within a year, check again in a year
+TRANSITION_HORIZON = 366
+
+
+def _offset_key(tzinfo, when):
+    local = when.astimezone(tzinfo)
+    return local.utcoffset(), local.tzname()
+
+
+def next_transition(tzinfo, after):
+    """
+    Returns the first point in time after the given one at which the UTC
+    offset or name of tzinfo changes, or a year later if it doesn't.
+    """
+    current = _offset_key(tzinfo, after)
+    lower = after
+    for _ in range(TRANSITION_HORIZON):
+        upper = lower + ONE_DAY
+        if _offset_key(tzinfo, upper) != current:
+            break
+        lower = upper
+    else:
+        return lower
+    # bisect down to the second
+    while upper - lower > ONE_SECOND:
+        middle = lower + (upper - lower) / 2
+        if _offset_key(tzinfo, middle) == current:
+            lower = middle
+        else:
+            upper = middle
+    return upper.replace(microsecond=0)
+
+
+class Zone:
+    """
+    A time zone for the world clock. Converting to it uses a fixed offset
+    that is only looked up again once the next transition has passed.
+    """
+
+    def __init__(self, name, tzinfo):
+        self.name = name
+        self.tzinfo = tzinfo
+        self.valid_until = None
+        self._fixed_tzinfo = None
+
+    def localize(self, now_utc):
+        if self.valid_until is None or now_utc >= self.valid_until:
+            offset, name = _offset_key(self.tzinfo, now_utc)
+            self._fixed_tzinfo = timezone(offset, name)
+            self.valid_until = next_transition(self.tzinfo, now_utc)
+        return now_utc.astimezone(self._fixed_tzinfo)
+
+
+def parse_zones(spec):
+    """
+    Turns a comma-separated list of time zone names into Zones. "local"
+    is the system's time zone.
+    """
+    from dateutil import tz
+
+    zones = []
+    for name in spec.split(","):
+        name = name.strip()
+        if not name:
+            continue
+        tzinfo = tz.tzlocal() if name == "local" else tz.gettz(name)
+        if tzinfo is None:
+            raise RuntimeError("Unknown time zone: {}".format(name))
+        zones.append(Zone(name, tzinfo))
+    if not zones:
+        raise RuntimeError("No time zones given")
+    return zones
+
+
+def world_clock(zones, now_utc, time_format):
+    """
+    Returns a list of (labels, text, local datetime) tuples for the given
+    zones. Zones that currently show the same text share an entry.
+    """
+    blocks = {}
+    for zone in zones:
+        local = zone.localize(now_utc)
+        text = local.strftime(time_format)
+        if text in blocks:
+            blocks[text][0].append(zone.name)
+        else:
+            blocks[text] = ([zone.name], text, local)
+    return list(blocks.values())